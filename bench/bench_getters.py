@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Micro-benchmark of the per-call overhead of the counter getters.
+###
+### It compares the getters generated from the pre-bound function table with
+### the way they used to be written (attribute lookup on the library, a new
+### counter and a call per read), with a call that has its argtypes declared
+### and with a full Snapshot(). Without the vmGuestLib library it runs against
+### a VMGuestLibSimulator backend.
+
+import sys
+import timeit
+from ctypes import CDLL, POINTER, byref, c_uint
+
+sys.path.insert(0, '.')
+
+import vmguestlib
+
+number = 100000
+if len(sys.argv) > 1:
+    number = int(sys.argv[1])
+
+if vmguestlib.FindLibrary() is None:
+    gl = vmguestlib.VMGuestLib(vmguestlib.VMGuestLibSimulator(vmguestlib.SyntheticTimeline(1)))
+else:
+    gl = vmguestlib.VMGuestLib()
+library = gl.backend.library
+
+def legacy():
+    counter = c_uint()
+    ret = library.VMGuestLib_GetMemUsedMB(gl.handle.value, byref(counter))
+    if ret != vmguestlib.VMGUESTLIB_ERROR_SUCCESS: raise vmguestlib.VMGuestLibException(ret)
+    return counter.value
+
+if isinstance(library, CDLL):
+    prototyped = CDLL(library._name).VMGuestLib_GetMemUsedMB
+    prototyped.restype = vmguestlib.VMGuestLibError
+    prototyped.argtypes = (vmguestlib.VMGuestLibHandle, POINTER(c_uint))
+else:
+    prototyped = library.VMGuestLib_GetMemUsedMB
+counter = c_uint()
+ref = byref(counter)
+
+def argtypes():
+    ret = prototyped(gl.handle, ref)
+    if ret != vmguestlib.VMGUESTLIB_ERROR_SUCCESS: raise vmguestlib.VMGuestLibException(ret)
+    return counter.value
+
+def report(name, func, number):
+    usec = min(timeit.repeat(func, number=number, repeat=3)) * 1000000.0 / number
+    print('%-32s %8.3f us/call' % (name, usec))
+    return usec
+
+before = report('GetMemUsedMB (unbound)', legacy, number)
+report('GetMemUsedMB (argtypes)', argtypes, number)
+after = report('GetMemUsedMB (pre-bound)', gl.GetMemUsedMB, number)
+print('%-32s %8.2fx' % ('speedup', before / after))
+report('Snapshot (%d counters)' % len(vmguestlib.VMCounters), gl.Snapshot, number // 10)
+
+gl.CloseHandle()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Benchmark of the time it takes to import vmguestlib in a fresh interpreter.
+###
+### Next to the import itself it measures the library lookup that is now done
+### when the first VMGuestLib is created (honouring VMGUESTLIB_PATH), and the
+### find_library() calls every import used to pay for.
+
+import os
+import subprocess
+import sys
+
+runs = 20
+if len(sys.argv) > 1:
+    runs = int(sys.argv[1])
+
+path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+timers = (
+    ('import vmguestlib', 'pass'),
+    ('FindLibrary()', 'vmguestlib.FindLibrary()'),
+    ('find_library() at import (old)', "from ctypes.util import find_library; find_library('vmGuestLib') or find_library('guestlib')"),
+)
+
+# Every timer runs in its own interpreter, so none benefits from the modules
+# imported by another
+child = '''
+import sys, time
+sys.path.insert(0, %r)
+start = time.time()
+import vmguestlib
+imported = time.time() - start
+start = time.time()
+exec(sys.argv[1])
+print('%%r %%r' %% (imported, time.time() - start))
+''' % path
+
+for name, statement in timers:
+    values = []
+    for run in range(runs):
+        output = subprocess.Popen([ sys.executable, '-c', child, statement ], stdout=subprocess.PIPE).communicate()[0]
+        imported, elapsed = [ float(value) for value in output.split() ]
+        if statement == 'pass':
+            values.append(imported)
+        else:
+            values.append(elapsed)
+    values.sort()
+    print('%-32s %8.3f ms (median of %d)' % (name, values[len(values) // 2] * 1000.0, runs))
+
+# vim:ts=4:sw=4:et
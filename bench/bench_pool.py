@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Benchmark of the snapshot throughput of a number of threads sharing a
+### single handle behind a lock, compared to a VMGuestLibPool.
+###
+### ctypes releases the GIL while a routine of the vmGuestLib library runs, so
+### the pool only pays off against a real (or stub) library. Without one the
+### benchmark runs against a VMGuestLibSimulator, whose routines hold the GIL.
+
+import sys
+import threading
+import time
+
+sys.path.insert(0, '.')
+
+import vmguestlib
+
+threads = 4
+seconds = 2.0
+if len(sys.argv) > 1:
+    threads = int(sys.argv[1])
+if len(sys.argv) > 2:
+    seconds = float(sys.argv[2])
+
+if vmguestlib.FindLibrary() is None:
+    backend = vmguestlib.VMGuestLibSimulator(vmguestlib.SyntheticTimeline(100), loop=True)
+else:
+    backend = None
+
+def run(worker):
+    '''Runs worker in all threads for the given time, returns snapshots/s.'''
+    counts = [ 0 ] * threads
+    deadline = time.time() + seconds
+    def loop(index):
+        while time.time() < deadline:
+            worker()
+            counts[index] = counts[index] + 1
+    workers = [ threading.Thread(target=loop, args=(index, )) for index in range(threads) ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(counts) / seconds
+
+gl = vmguestlib.VMGuestLib(backend)
+lock = threading.Lock()
+
+def locked():
+    lock.acquire()
+    try:
+        gl.UpdateAndSnapshot()
+    finally:
+        lock.release()
+
+pool = vmguestlib.VMGuestLibPool(threads, backend)
+
+def pooled():
+    with pool.Handle() as gl:
+        gl.UpdateAndSnapshot()
+
+single = run(locked)
+print('%-32s %10.0f snapshots/s' % ('single handle, locked', single))
+multiple = run(pooled)
+print('%-32s %10.0f snapshots/s' % ('pool of %d handles' % threads, multiple))
+print('%-32s %10.2fx' % ('speedup', multiple / single))
+
+gl.CloseHandle()
+pool.Close()
+
+# vim:ts=4:sw=4:et
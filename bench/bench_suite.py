@@ -0,0 +1,227 @@
+#!/usr/bin/python
+
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Benchmark suite of the per-call and per-snapshot costs of the wrapper.
+###
+### It measures the import time, opening and closing a handle, UpdateInfo,
+### every getter, a full snapshot, the error path of a counter that is not
+### available, the cost of instrumentation and the snapshot throughput of
+### several threads, each with its own handle. The results can be saved as
+### JSON and compared with those of another version:
+###
+###     bench/bench_suite.py -o before.json
+###     (upgrade)
+###     bench/bench_suite.py -o after.json -c before.json
+###
+### By default it runs against the stand-in library built from
+### vmguestlib_stub.c with the C compiler ($CC or cc), so results do not
+### depend on the hypervisor. Use -l to run against another library, like the
+### real one, or -s to run against a VMGuestLibSimulator when there is no
+### compiler.
+
+import json
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+bench = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(bench))
+
+import vmguestlib
+
+parser = optparse.OptionParser(usage='usage: %prog [-l LIBRARY | -s] [-n NUMBER] [-t THREADS] [-o FILE] [-c FILE]')
+parser.add_option( '-l', '--library', action='store', metavar='LIBRARY',
+    dest='library', help='benchmark against this vmGuestLib library instead of the stub' )
+parser.add_option( '-s', '--simulator', action='store_true',
+    dest='simulator', help='benchmark against a VMGuestLibSimulator instead of the stub' )
+parser.add_option( '-n', '--number', action='store', type='int', default=100000,
+    dest='number', help='number of calls per measurement (default 100000)' )
+parser.add_option( '-t', '--threads', action='store', type='int', default=4,
+    dest='threads', help='number of threads for the throughput test (default 4)' )
+parser.add_option( '-d', '--duration', action='store', type='float', default=2.0,
+    dest='duration', help='seconds per throughput test (default 2)' )
+parser.add_option( '-o', '--output', action='store', metavar='FILE',
+    dest='output', help='save the results as JSON' )
+parser.add_option( '-c', '--compare', action='store', metavar='FILE',
+    dest='compare', help='compare with results saved before' )
+(options, args) = parser.parse_args()
+
+def Build(directory):
+    '''Compiles the stub library, returns its path.'''
+    path = os.path.join(directory, 'libvmGuestLib.so')
+    command = [ os.environ.get('CC', 'cc'), '-O2', '-shared', '-fPIC', '-o', path, os.path.join(bench, 'vmguestlib_stub.c') ]
+    if subprocess.call(command) != 0:
+        sys.exit('ERROR: Cannot build the stub library, use -l or -s')
+    return path
+
+# Name, value and unit of every measurement, in order
+results = []
+
+def Report(name, value, unit):
+    results.append((name, value, unit))
+    print('%-36s %12.3f %s' % (name, value, unit))
+
+def PerCall(name, func, number):
+    '''Reports the best time of three runs of number calls, in us per call.'''
+    usec = min(timeit.repeat(func, number=number, repeat=3)) * 1000000.0 / number
+    Report(name, usec, 'us')
+
+def Imports(runs=20):
+    '''Reports the median time to import vmguestlib, and to create the first
+       VMGuestLib, in a fresh interpreter.'''
+    child = '''
+import sys, time
+sys.path.insert(0, %r)
+start = time.time()
+import vmguestlib
+imported = time.time() - start
+start = time.time()
+vmguestlib.VMGuestLib().CloseHandle()
+print('%%r %%r' %% (imported, time.time() - start))
+''' % os.path.dirname(bench)
+    imports, firsts = [], []
+    for run in range(runs):
+        output = subprocess.Popen([ sys.executable, '-c', child ], stdout=subprocess.PIPE).communicate()[0]
+        imported, first = [ float(value) for value in output.split() ]
+        imports.append(imported)
+        firsts.append(first)
+    imports.sort()
+    firsts.sort()
+    Report('import vmguestlib', imports[runs // 2] * 1000.0, 'ms')
+    Report('first VMGuestLib()', firsts[runs // 2] * 1000.0, 'ms')
+
+def Throughput(threads, backend):
+    '''Reports the snapshots per second of threads threads, each with its own
+       handle.'''
+    handles = [ vmguestlib.VMGuestLib(backend) for index in range(threads) ]
+    counts = [ 0 ] * threads
+    start = threading.Event()
+    def Loop(index):
+        gl = handles[index]
+        start.wait()
+        deadline = time.time() + options.duration
+        while time.time() < deadline:
+            gl.UpdateAndSnapshot()
+            counts[index] = counts[index] + 1
+    workers = [ threading.Thread(target=Loop, args=(index, )) for index in range(threads) ]
+    for thread in workers:
+        thread.start()
+    start.set()
+    for thread in workers:
+        thread.join()
+    for gl in handles:
+        gl.CloseHandle()
+    Report('UpdateAndSnapshot %d thread(s)' % threads, sum(counts) / options.duration, '/s')
+
+directory = None
+backend = None
+if options.simulator:
+    kind = 'simulator'
+    backend = vmguestlib.VMGuestLibSimulator(vmguestlib.SyntheticTimeline(100), loop=True)
+elif options.library:
+    kind = 'library'
+    os.environ['VMGUESTLIB_PATH'] = os.path.abspath(options.library)
+else:
+    kind = 'stub'
+    directory = tempfile.mkdtemp()
+    os.environ['VMGUESTLIB_PATH'] = Build(directory)
+
+number = options.number
+print('vmguestlib %s, Python %s, %s' % (vmguestlib.__version__, sys.version.split()[0], kind))
+
+if backend is None:
+    Imports()
+
+gl = vmguestlib.VMGuestLib(backend)
+
+other = vmguestlib.VMGuestLib(backend)
+def OpenClose():
+    # OpenHandle() only returns the new handle, CloseHandle() closes the stored one
+    other.handle = other.OpenHandle()
+    other.CloseHandle()
+PerCall('OpenHandle + CloseHandle', OpenClose, number // 10)
+
+PerCall('UpdateInfo', gl.UpdateInfo, number)
+PerCall('GetSessionId', gl.GetSessionId, number)
+
+gl.UpdateInfo()
+available = gl.Probe()
+for name, ctype, doc in vmguestlib.VMCounters:
+    if name in available:
+        PerCall('Get' + name, getattr(gl, 'Get' + name), number)
+
+PerCall('Snapshot', gl.Snapshot, number // 10)
+PerCall('UpdateAndSnapshot', gl.UpdateAndSnapshot, number // 10)
+
+missing = [ name for name, ctype, doc in vmguestlib.VMCounters if name not in available ]
+if missing:
+    getter = getattr(gl, 'Get' + missing[0])
+    def Missing():
+        try:
+            getter()
+        except vmguestlib.VMGuestLibException:
+            pass
+    PerCall('Get%s (raises)' % missing[0], Missing, number)
+PerCall('VMGuestLibException()', lambda: vmguestlib.VMGuestLibException(vmguestlib.VMGUESTLIB_ERROR_NOT_AVAILABLE, gl.backend), number)
+
+# The cost of instrumentation, against the pre-bound getters measured above
+gl.Instrument()
+PerCall('GetMemUsedMB (instrumented)', gl.GetMemUsedMB, number)
+PerCall('UpdateAndSnapshot (instrumented)', gl.UpdateAndSnapshot, number // 10)
+
+gl.CloseHandle()
+
+Throughput(1, backend)
+if options.threads > 1:
+    Throughput(options.threads, backend)
+
+if directory is not None:
+    shutil.rmtree(directory)
+
+if options.output:
+    data = {
+        'vmguestlib': vmguestlib.__version__,
+        'python': sys.version.split()[0],
+        'backend': kind,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': dict([ (name, { 'value': value, 'unit': unit }) for name, value, unit in results ]),
+    }
+    output = open(options.output, 'w')
+    json.dump(data, output, indent=2, sort_keys=True)
+    output.close()
+
+if options.compare:
+    before = json.load(open(options.compare))
+    print('')
+    print('Compared with vmguestlib %s, Python %s, %s' % (before['vmguestlib'], before['python'], before['backend']))
+    for name, value, unit in results:
+        if name not in before['results'] or not before['results'][name]['value']:
+            continue
+        old = before['results'][name]['value']
+        # Above 1 is better for both, as throughput is the only rate
+        if unit == '/s':
+            ratio = value / old
+        else:
+            ratio = old / value
+        print('%-36s %12.3f -> %12.3f %-2s %6.2fx' % (name, old, value, unit, ratio))
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,168 @@
+/*
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+ */
+
+/*
+ * Stand-in for the vmGuestLib library, to benchmark the wrapper outside of a
+ * VMware guest. It exports every routine vmguestlib uses with the same
+ * signatures. The cumulative counters grow by a second on every update, the
+ * others are constant. MemZippedMB is not available, to measure the error
+ * path. Set VMGUESTLIB_STUB_DELAY to a number of microseconds every update
+ * should take, like a real call into the hypervisor.
+ *
+ * Build with: cc -O2 -shared -fPIC -o libvmGuestLib.so vmguestlib_stub.c
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+#define VMGUESTLIB_ERROR_SUCCESS 0
+#define VMGUESTLIB_ERROR_NOT_AVAILABLE 4
+#define VMGUESTLIB_ERROR_INVALID_HANDLE 8
+#define VMGUESTLIB_ERROR_INVALID_ARG 9
+
+typedef int VMGuestLibError;
+typedef void *VMGuestLibHandle;
+
+struct stub {
+    uint64_t updates;
+};
+
+static unsigned int delay;
+
+static const char *errors[] = {
+    "No error",
+    "Other error",
+    "Not running in a VM",
+    "Not enabled",
+    "Not available",
+    "No info",
+    "Memory error",
+    "Buffer too small",
+    "Invalid handle",
+    "Invalid argument",
+    "Unsupported version",
+};
+
+VMGuestLibError VMGuestLib_OpenHandle(VMGuestLibHandle *handle)
+{
+    const char *value = getenv("VMGUESTLIB_STUB_DELAY");
+    if (handle == NULL)
+        return VMGUESTLIB_ERROR_INVALID_ARG;
+    if (value != NULL)
+        delay = (unsigned int)atoi(value);
+    *handle = calloc(1, sizeof(struct stub));
+    return VMGUESTLIB_ERROR_SUCCESS;
+}
+
+VMGuestLibError VMGuestLib_CloseHandle(VMGuestLibHandle handle)
+{
+    if (handle == NULL)
+        return VMGUESTLIB_ERROR_INVALID_HANDLE;
+    free(handle);
+    return VMGUESTLIB_ERROR_SUCCESS;
+}
+
+VMGuestLibError VMGuestLib_UpdateInfo(VMGuestLibHandle handle)
+{
+    if (handle == NULL)
+        return VMGUESTLIB_ERROR_INVALID_HANDLE;
+    if (delay)
+        usleep(delay);
+    ((struct stub *)handle)->updates++;
+    return VMGUESTLIB_ERROR_SUCCESS;
+}
+
+VMGuestLibError VMGuestLib_GetSessionId(VMGuestLibHandle handle, uint64_t *id)
+{
+    if (handle == NULL)
+        return VMGUESTLIB_ERROR_INVALID_HANDLE;
+    *id = 0x5649525455414cULL;
+    return VMGUESTLIB_ERROR_SUCCESS;
+}
+
+const char *VMGuestLib_GetErrorText(VMGuestLibError error)
+{
+    if (error < 0 || error >= (int)(sizeof(errors) / sizeof(errors[0])))
+        return "Unknown error";
+    return errors[error];
+}
+
+/* A counter that grows by step on every update */
+#define CUMULATIVE(name, step) \
+VMGuestLibError VMGuestLib_Get##name(VMGuestLibHandle handle, uint64_t *value) \
+{ \
+    if (handle == NULL) \
+        return VMGUESTLIB_ERROR_INVALID_HANDLE; \
+    *value = ((struct stub *)handle)->updates * (step); \
+    return VMGUESTLIB_ERROR_SUCCESS; \
+}
+
+/* A counter that does not change */
+#define CONSTANT(name, constant) \
+VMGuestLibError VMGuestLib_Get##name(VMGuestLibHandle handle, uint32_t *value) \
+{ \
+    if (handle == NULL) \
+        return VMGUESTLIB_ERROR_INVALID_HANDLE; \
+    *value = (constant); \
+    return VMGUESTLIB_ERROR_SUCCESS; \
+}
+
+/* A counter the host does not provide */
+#define MISSING(name) \
+VMGuestLibError VMGuestLib_Get##name(VMGuestLibHandle handle, uint32_t *value) \
+{ \
+    if (handle == NULL) \
+        return VMGUESTLIB_ERROR_INVALID_HANDLE; \
+    return VMGUESTLIB_ERROR_NOT_AVAILABLE; \
+}
+
+CUMULATIVE(ElapsedMs, 1000)
+CUMULATIVE(CpuUsedMs, 250)
+CUMULATIVE(CpuStolenMs, 5)
+CUMULATIVE(HostCpuUsedMs, 4000)
+
+CONSTANT(CpuLimitMHz, 0xFFFFFFFF)
+CONSTANT(CpuReservationMHz, 0)
+CONSTANT(CpuShares, 2000)
+CONSTANT(HostMemKernOvhdMB, 1024)
+CONSTANT(HostMemMappedMB, 180000)
+CONSTANT(HostMemPhysFreeMB, 20000)
+CONSTANT(HostMemPhysMB, 262144)
+CONSTANT(HostMemSharedMB, 30000)
+CONSTANT(HostMemSwappedMB, 0)
+CONSTANT(HostMemUnmappedMB, 10000)
+CONSTANT(HostMemUsedMB, 240000)
+CONSTANT(HostNumCpuCores, 16)
+CONSTANT(HostProcessorSpeed, 2600)
+CONSTANT(MemActiveMB, 1100)
+CONSTANT(MemBalloonedMB, 0)
+CONSTANT(MemBalloonMaxMB, 8000)
+CONSTANT(MemBalloonTargetMB, 0)
+CONSTANT(MemLimitMB, 0xFFFFFFFF)
+CONSTANT(MemLLSwappedMB, 0)
+CONSTANT(MemMappedMB, 12288)
+CONSTANT(MemOverheadMB, 110)
+CONSTANT(MemReservationMB, 0)
+CONSTANT(MemSharedMB, 69)
+CONSTANT(MemSharedSavedMB, 68)
+CONSTANT(MemShares, 122880)
+CONSTANT(MemSwappedMB, 0)
+CONSTANT(MemSwapTargetMB, 0)
+CONSTANT(MemTargetSizeMB, 12219)
+CONSTANT(MemUsedMB, 12219)
+CONSTANT(MemZipSavedMB, 0)
+MISSING(MemZippedMB)
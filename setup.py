@@ -19,14 +19,16 @@ if __name__ == '__main__':
         description='Python API for interacting with VMware\'s VMGuestLib SDK',
         license = 'GPLv2',
         install_requires=['ctypes', ],
-        py_modules = ['vmguestlib', ],
-        scripts=[ 'vmguest-stats', ],
+        extras_require={ 'analysis': ['numpy', ], },
+        py_modules = ['vmguestlib', 'vmguestlib_async', 'vmguestlib_record', 'vmguestlib_analysis', 'vmguestlib_format', 'vmguestlib_shm', ],
+        scripts=[ 'vmguest-stats', 'vmguest-exporter', ],
         keywords = ['Virtual', 'vmware', 'ESX', 'ESXi', 'VMGuestLib', 'SDK', 'API'],
         classifiers = [
             'Programming Language :: Python',
             'Programming Language :: Python :: 2.5',
             'Programming Language :: Python :: 2.6',
             'Programming Language :: Python :: 2.7',
+            'Programming Language :: Python :: 3',
             'Operating System :: OS Independent',
             'Development Status :: 5 - Production/Stable',
             'Environment :: Other Environment',
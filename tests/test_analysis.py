@@ -0,0 +1,106 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Histories loaded from a recording against histories built from the
+### snapshots it replays, requires NumPy.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy
+    from vmguestlib_analysis import VMGuestLibHistory
+except ImportError:
+    numpy = None
+
+from vmguestlib import VMGuestLib, VMGuestLibSimulator, SyntheticTimeline
+from vmguestlib_record import VMGuestLibRecorder, VMGuestLibReplay
+
+@unittest.skipIf(numpy is None, 'requires NumPy')
+class AnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'vm.rec')
+        # Timestamps of today, as recorded by vmguest-stats
+        self.now = float(int(time.time()))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def Record(self, count, sessions=1, blocksize=4):
+        '''Records count snapshots one second apart, returns the replay.'''
+        gl = VMGuestLib(VMGuestLibSimulator(SyntheticTimeline(count + 1, sessions=sessions)))
+        recorder = VMGuestLibRecorder(self.path, blocksize=blocksize)
+        for index in range(count):
+            recorder.Append(gl.UpdateAndSnapshot(), self.now + index)
+        recorder.Close()
+        gl.CloseHandle()
+        replay = VMGuestLibReplay(self.path)
+        self.addCleanup(replay.Close)
+        return replay
+
+    def assertHistoryEqual(self, loaded, built):
+        numpy.testing.assert_array_equal(loaded.timestamps, built.timestamps)
+        numpy.testing.assert_array_equal(loaded.sessions, built.sessions)
+        self.assertEqual(sorted(loaded.columns), sorted(built.columns))
+        for name in built.columns:
+            numpy.testing.assert_array_equal(loaded[name], built[name])
+        for loadedRates, builtRates in zip(loaded.Rates(), built.Rates()):
+            numpy.testing.assert_array_equal(loadedRates, builtRates)
+        self.assertEqual(loaded.Sessions(), built.Sessions())
+
+    def testFromReplay(self):
+        replay = self.Record(10)
+        history = VMGuestLibHistory.FromReplay(replay)
+        self.assertEqual(len(history), 10)
+        self.assertEqual(history.timestamps[0], self.now)
+        self.assertHistoryEqual(history, VMGuestLibHistory.FromSnapshots(list(replay)))
+
+    def testSessions(self):
+        replay = self.Record(12, sessions=3, blocksize=256)
+        history = VMGuestLibHistory.FromReplay(replay)
+        self.assertHistoryEqual(history, VMGuestLibHistory.FromSnapshots(list(replay)))
+        self.assertEqual(len(history.Sessions()), 3)
+        # The first rate of every session is unknown
+        elapsed = history.Rates().ElapsedMs
+        for start, stop in history.Sessions():
+            self.assertTrue(numpy.isnan(elapsed[start]))
+            self.assertFalse(numpy.isnan(elapsed[start + 1:stop]).any())
+
+    def testSlice(self):
+        replay = self.Record(10)
+        start, end = self.now + 3, self.now + 6
+        history = VMGuestLibHistory.FromReplay(replay, start, end)
+        self.assertEqual(len(history), 4)
+        self.assertHistoryEqual(history, VMGuestLibHistory.FromSnapshots(list(replay.Slice(start, end))))
+        self.assertEqual(len(VMGuestLibHistory.FromReplay(replay, self.now + 100, None)), 0)
+
+    def testEmpty(self):
+        VMGuestLibRecorder(self.path).Close()
+        replay = VMGuestLibReplay(self.path)
+        self.addCleanup(replay.Close)
+        self.assertEqual(len(VMGuestLibHistory.FromReplay(replay)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,98 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Round trip of snapshots from a VMGuestLibSimulator through a recording.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vmguestlib import VMGuestLib, VMGuestLibSimulator, SyntheticTimeline
+from vmguestlib_record import VMGuestLibRecorder, VMGuestLibReplay
+
+class RecordTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'vm.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def Record(self, count, sessions=1, blocksize=4):
+        '''Records count snapshots one second apart, returns them with their
+           timestamps.'''
+        gl = VMGuestLib(VMGuestLibSimulator(SyntheticTimeline(count + 1, sessions=sessions)))
+        recorder = VMGuestLibRecorder(self.path, blocksize=blocksize)
+        recorded = []
+        for index in range(count):
+            snapshot = gl.UpdateAndSnapshot()
+            recorder.Append(snapshot, 1000.0 + index)
+            recorded.append((1000.0 + index, snapshot))
+        recorder.Close()
+        gl.CloseHandle()
+        return recorded
+
+    def testEmpty(self):
+        VMGuestLibRecorder(self.path).Close()
+        replay = VMGuestLibReplay(self.path)
+        self.assertEqual(len(replay), 0)
+        self.assertEqual(list(replay), [])
+        self.assertEqual(list(replay.Slice(1000.0, 2000.0)), [])
+        replay.Close()
+
+    def testRoundTrip(self):
+        recorded = self.Record(10)
+        replay = VMGuestLibReplay(self.path)
+        # Ten snapshots in blocks of four
+        self.assertEqual(replay.blocks, 3)
+        self.assertEqual(list(replay), recorded)
+        replay.Close()
+
+    def testSessions(self):
+        recorded = self.Record(12, sessions=3, blocksize=256)
+        self.assertEqual(len(set([ snapshot.SessionId for timestamp, snapshot in recorded ])), 3)
+        replay = VMGuestLibReplay(self.path)
+        # Every session change starts a new block
+        self.assertEqual(replay.blocks, 3)
+        self.assertEqual(list(replay), recorded)
+        replay.Close()
+
+    def testSlice(self):
+        recorded = self.Record(10)
+        replay = VMGuestLibReplay(self.path)
+        self.assertEqual(list(replay.Slice(1003.0, 1006.0)), recorded[3:7])
+        self.assertEqual(list(replay.Slice(1002.5, None)), recorded[3:])
+        self.assertEqual(list(replay.Slice(None, 1001.0)), recorded[:2])
+        self.assertEqual(list(replay.Slice(2000.0, None)), [])
+        replay.Close()
+
+    def testAppend(self):
+        recorded = self.Record(3)
+        recorder = VMGuestLibRecorder(self.path)
+        recorder.Append(recorded[-1][1], 1010.0)
+        recorder.Close()
+        replay = VMGuestLibReplay(self.path)
+        self.assertEqual(list(replay), recorded + [ (1010.0, recorded[-1][1]) ])
+        replay.Close()
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,144 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Snapshots of a VMGuestLibSimulator published to shared memory and read back.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vmguestlib_shm
+from vmguestlib import VMCounters, VMGuestLibException, VMGuestLibSimulator, \
+    SyntheticTimeline, VMGUESTLIB_ERROR_NO_INFO
+from vmguestlib_shm import VMGuestLibPublisher, VMGuestLibSharedReader, \
+    _Sequence, _SequenceOffset
+
+class SharedMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'vmguestlib')
+        self.publisher = self.Publisher()
+
+    def tearDown(self):
+        self.publisher.Stop()
+        shutil.rmtree(self.directory)
+
+    def Publisher(self, sessions=1):
+        return VMGuestLibPublisher(self.path, 1.0, VMGuestLibSimulator(SyntheticTimeline(10, sessions=sessions)))
+
+    def Reader(self, staleness=None):
+        reader = VMGuestLibSharedReader(self.path, staleness)
+        self.addCleanup(reader.CloseHandle)
+        return reader
+
+    def assertNoInfo(self, function):
+        try:
+            function()
+        except VMGuestLibException as e:
+            self.assertEqual(e.errno, VMGUESTLIB_ERROR_NO_INFO)
+        else:
+            self.fail('VMGuestLibException not raised')
+
+    def testGetters(self):
+        self.publisher._Sample()
+        snapshot = self.publisher.Latest()
+        reader = self.Reader()
+        self.assertEqual(reader.Snapshot(), snapshot)
+        self.assertEqual(reader.GetSessionId().value, snapshot.SessionId)
+        for name, ctype, doc in VMCounters:
+            value = getattr(snapshot, name)
+            if value is None:
+                self.assertRaises(VMGuestLibException, getattr(reader, 'Get' + name))
+            else:
+                self.assertEqual(getattr(reader, 'Get' + name)(), value)
+
+        # Only a new publication changes what the reader sees
+        self.publisher._Sample()
+        self.assertEqual(reader.UpdateAndSnapshot(), self.publisher.Latest())
+        self.assertNotEqual(reader.Snapshot(), snapshot)
+
+    def testNothingPublished(self):
+        self.assertNoInfo(self.Reader)
+
+    def testSessions(self):
+        self.publisher.Stop()
+        self.publisher = self.Publisher(sessions=2)
+        self.publisher._Sample()
+        reader = self.Reader()
+        changes = []
+        reader.AddSessionListener(lambda gl, old, new: changes.append((old, new)))
+        first = reader.GetSessionId().value
+        for index in range(5):
+            self.publisher._Sample()
+            reader.UpdateInfo()
+        self.assertEqual(changes, [ (first, reader.GetSessionId().value) ])
+        self.assertNotEqual(first, reader.GetSessionId().value)
+        self.assertEqual(reader.sessionChanges, 1)
+
+    def testStale(self):
+        self.publisher._Sample()
+        # Three intervals of the publisher by default
+        self.publisher.Publish(self.publisher.Latest(), time.time() - 2.0)
+        reader = self.Reader()
+        self.publisher.Publish(self.publisher.Latest(), time.time() - 4.0)
+        self.assertNoInfo(reader.UpdateInfo)
+        # Unless told otherwise
+        self.Reader(staleness=5.0).UpdateInfo()
+        self.Reader(staleness=0).UpdateInfo()
+        self.assertNoInfo(lambda: self.Reader(staleness=1.0))
+
+    def testSequence(self):
+        self.publisher._Sample()
+        reader = self.Reader()
+        sequence = self.publisher.sequence
+        self.assertEqual(sequence % 2, 0)
+
+        # A publisher that stopped halfway leaves an odd sequence number, which
+        # readers wait on until they give up
+        self.publisher.map[_SequenceOffset:_SequenceOffset + _Sequence.size] = _Sequence.pack(sequence + 1)
+        timeout = vmguestlib_shm._Timeout
+        vmguestlib_shm._Timeout = 0.05
+        try:
+            self.assertNoInfo(reader.UpdateInfo)
+        finally:
+            vmguestlib_shm._Timeout = timeout
+
+        # The next publisher continues after it, with an even sequence number
+        self.publisher.Stop()
+        self.publisher = self.Publisher()
+        self.assertEqual(self.publisher.sequence, sequence + 2)
+        self.publisher._Sample()
+        self.assertEqual(self.publisher.sequence, sequence + 4)
+        reader.UpdateInfo()
+        self.assertEqual(reader.Snapshot(), self.publisher.Latest())
+
+    def testNoHandle(self):
+        self.publisher._Sample()
+        reader = self.Reader()
+        self.assertEqual(reader.Instrument(), None)
+        self.assertEqual(reader.Stats(), {})
+        reader.ReopenHandle()
+        self.assertEqual(reader.Snapshot(), self.publisher.Latest())
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:ts=4:sw=4:et
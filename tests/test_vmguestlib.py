@@ -0,0 +1,227 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### The core paths of vmguestlib, driven by a VMGuestLibSimulator.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vmguestlib import VMCounters, VMGuestLib, VMGuestLibException, \
+    VMGuestLibSimulator, SyntheticTimeline, VMGuestLibRateSampler, \
+    VMGuestLibSampler, VMGuestLibPool, VMGuestLibCache, CachedVMGuestLib, VMGuestLibPressureMonitor, \
+    VMGUESTLIB_ERROR_NOT_AVAILABLE, VMGUESTLIB_ERROR_NOT_RUNNING_IN_VM, \
+    VMGUESTLIB_ERROR_INVALID_HANDLE, VMGUESTLIB_ERROR_UNSUPPORTED_VERSION
+
+def Timeline(count, sessions=1, missing=()):
+    '''Returns a SyntheticTimeline without the missing counters.'''
+    samples = SyntheticTimeline(count, sessions=sessions)
+    for sample in samples:
+        for name in missing:
+            del(sample[name])
+    return samples
+
+class VMGuestLibTest(unittest.TestCase):
+    def assertErrno(self, errno, function, *args):
+        try:
+            function(*args)
+        except VMGuestLibException as e:
+            self.assertEqual(e.errno, errno)
+        else:
+            self.fail('VMGuestLibException not raised')
+
+    def testSnapshot(self):
+        samples = Timeline(3, missing=('MemZippedMB',))
+        samples[1]['Errors'] = { 'GetMemSharedMB': VMGUESTLIB_ERROR_NOT_AVAILABLE }
+        gl = VMGuestLib(VMGuestLibSimulator(samples))
+        snapshot = gl.Snapshot()
+        self.assertEqual(snapshot.SessionId, samples[0]['SessionId'])
+        self.assertEqual(snapshot.SessionId, gl.GetSessionId().value)
+        for name, ctype, doc in VMCounters:
+            if name == 'MemZippedMB':
+                self.assertEqual(snapshot.MemZippedMB, None)
+                self.assertErrno(VMGUESTLIB_ERROR_UNSUPPORTED_VERSION, gl.GetMemZippedMB)
+            else:
+                self.assertEqual(getattr(snapshot, name), samples[0][name])
+                self.assertEqual(getattr(gl, 'Get' + name)(), samples[0][name])
+
+        snapshot = gl.UpdateAndSnapshot()
+        self.assertEqual(snapshot.ElapsedMs, samples[1]['ElapsedMs'])
+        self.assertEqual(snapshot.MemSharedMB, None)
+        self.assertErrno(VMGUESTLIB_ERROR_NOT_AVAILABLE, gl.GetMemSharedMB)
+        self.assertEqual(gl.UpdateAndSnapshot().MemSharedMB, samples[2]['MemSharedMB'])
+        gl.CloseHandle()
+
+    def testProbe(self):
+        # Two sessions of two samples
+        gl = VMGuestLib(VMGuestLibSimulator(Timeline(4, sessions=2, missing=('MemZippedMB',))))
+        gl.Instrument()
+        def Calls():
+            return gl.Stats()['VMGuestLib_GetMemZippedMB']['calls']
+        self.assertFalse('MemZippedMB' in gl.Probe())
+        self.assertTrue('MemMappedMB' in gl.Probe())
+        self.assertEqual(Calls(), 1)
+        # Missing counters are not read again in the same session
+        gl.Snapshot()
+        gl.UpdateAndSnapshot()
+        self.assertEqual(Calls(), 1)
+        # but are probed again in a new one
+        gl.UpdateAndSnapshot()
+        self.assertEqual(Calls(), 2)
+        gl.CloseHandle()
+
+    def testSessionChange(self):
+        samples = Timeline(4, sessions=2)
+        gl = VMGuestLib(VMGuestLibSimulator(samples))
+        changes = []
+        gl.AddSessionListener(lambda gl, old, new: changes.append((old, new)))
+        for index in range(3):
+            gl.UpdateInfo()
+        self.assertEqual(changes, [ (samples[0]['SessionId'], samples[2]['SessionId']) ])
+        self.assertEqual(gl.sessionChanges, 1)
+        gl.CloseHandle()
+
+    def testInvalidHandle(self):
+        simulator = VMGuestLibSimulator(Timeline(3))
+        gl = VMGuestLib(simulator)
+        # As if the library lost track of the handle
+        simulator.library.handles.clear()
+        gl.UpdateInfo()
+        self.assertEqual(gl.reopened, 1)
+        self.assertEqual(list(simulator.library.handles), [ gl.handle.value ])
+        self.assertEqual(gl.Snapshot().ElapsedMs, 1000)
+
+        gl.recover = False
+        simulator.library.handles.clear()
+        self.assertErrno(VMGUESTLIB_ERROR_INVALID_HANDLE, gl.UpdateInfo)
+        self.assertEqual(gl.reopened, 1)
+
+    def testRateSampler(self):
+        # Two sessions of three samples
+        gl = VMGuestLib(VMGuestLibSimulator(Timeline(6, sessions=2)))
+        sampler = VMGuestLibRateSampler(gl)
+        self.assertEqual(sampler.Update(gl.Snapshot()), None)
+        rates = [ sampler.Sample() for index in range(5) ]
+        self.assertEqual([ rate is None for rate in rates ], [ False, False, True, False, False ])
+        self.assertEqual(sampler.resets, 1)
+        self.assertEqual(rates[0].ElapsedMs, 1000)
+        self.assertTrue(0 <= rates[0].CpuUsedPct <= 100)
+        gl.CloseHandle()
+
+        # Cumulative counters going backwards in the same session
+        samples = Timeline(3)
+        samples[2]['ElapsedMs'] = 0
+        gl = VMGuestLib(VMGuestLibSimulator(samples))
+        sampler = VMGuestLibRateSampler(gl)
+        sampler.Update(gl.Snapshot())
+        self.assertNotEqual(sampler.Sample(), None)
+        self.assertEqual(sampler.Sample(), None)
+        self.assertEqual(sampler.resets, 1)
+        gl.CloseHandle()
+
+    def testSamplerRestart(self):
+        simulator = VMGuestLibSimulator(Timeline(5))
+        sampler = VMGuestLibSampler(3600, backend=simulator)
+        sampler.Start()
+        sampler.Stop()
+        self.assertEqual(simulator.library.handles, {})
+        sampler.Start()
+        self.assertEqual(sampler.error, None)
+        self.assertEqual(sampler.samples, 2)
+        self.assertNotEqual(sampler.Latest(), None)
+        sampler.Stop()
+        self.assertEqual(simulator.library.handles, {})
+
+    def testRatesWithoutElapsed(self):
+        gl = VMGuestLib(VMGuestLibSimulator(Timeline(2, missing=('ElapsedMs',))))
+        sampler = VMGuestLibRateSampler(gl)
+        sampler.Update(gl.Snapshot())
+        rates = sampler.Sample()
+        self.assertEqual(rates.ElapsedMs, None)
+        self.assertEqual(rates.CpuUsedPct, None)
+        self.assertEqual(rates.EffectiveMHz, None)
+        gl.CloseHandle()
+
+    def testPoolReopen(self):
+        simulator = VMGuestLibSimulator(Timeline(3))
+        pool = VMGuestLibPool(2, simulator)
+        gl = pool.Checkout()
+        pool.Checkin(gl)
+        simulator.library.handles.clear()
+        self.assertTrue(pool.Checkout() is gl)
+        self.assertEqual(pool.reopened, 1)
+        self.assertEqual(list(simulator.library.handles), [ gl.handle.value ])
+        pool.Checkin(gl)
+        pool.Close()
+        self.assertEqual(simulator.library.handles, {})
+
+    def testPoolDiscard(self):
+        samples = Timeline(3)
+        samples[1]['Errors'] = { 'GetSessionId': VMGUESTLIB_ERROR_NOT_RUNNING_IN_VM }
+        simulator = VMGuestLibSimulator(samples)
+        pool = VMGuestLibPool(1, simulator)
+        gl = pool.Checkout()
+        self.assertErrno(VMGUESTLIB_ERROR_NOT_RUNNING_IN_VM, gl.UpdateInfo)
+        pool.Checkin(gl)
+        # The handle fails its check, it is closed and its slot freed
+        self.assertErrno(VMGUESTLIB_ERROR_NOT_RUNNING_IN_VM, pool.Checkout)
+        self.assertEqual(simulator.library.handles, {})
+        other = pool.Checkout(timeout=0)
+        self.assertFalse(other is gl)
+        pool.Checkin(other)
+        pool.Close()
+
+    def testCache(self):
+        simulator = VMGuestLibSimulator(Timeline(5))
+        cache = VMGuestLibCache(3600, simulator)
+        first = CachedVMGuestLib(cache)
+        second = CachedVMGuestLib(cache)
+        first.UpdateInfo()
+        second.UpdateInfo()
+        self.assertEqual(cache.Stats()['misses'], 1)
+        self.assertEqual(cache.Stats()['hits'], 3)
+        self.assertEqual(first.GetElapsedMs(), second.GetElapsedMs())
+
+        # Every update goes to the library without a ttl
+        cache.ttl = 0
+        first.UpdateInfo()
+        second.UpdateInfo()
+        self.assertEqual(cache.Stats()['misses'], 3)
+        self.assertEqual(second.GetElapsedMs(), 3000)
+        self.assertEqual(first.GetElapsedMs(), 2000)
+        cache.Close()
+        self.assertEqual(simulator.library.handles, {})
+
+    def testPressure(self):
+        # Out of 1000 MB, the part that is ballooned
+        samples = []
+        for index, ballooned in enumerate((0, 350, 250, 350, 50, 200, 300)):
+            samples.append({ 'SessionId': 1, 'ElapsedMs': index * 1000, 'MemMappedMB': 1000 - ballooned, 'MemBalloonedMB': ballooned })
+        monitor = VMGuestLibPressureMonitor(VMGuestLib(VMGuestLibSimulator(samples)))
+        events = []
+        monitor.Subscribe('Memory', 0.3, lambda pressure, on: events.append((on, pressure.Memory)), off=0.1)
+        scores = [ monitor.Sample().Memory for sample in samples[1:] ]
+        self.assertEqual(scores, [ 0.35, 0.25, 0.35, 0.05, 0.2, 0.3 ])
+        # Hovering between the thresholds does not fire
+        self.assertEqual(events, [ (True, 0.35), (False, 0.05), (True, 0.3) ])
+        self.assertEqual(monitor.pressure.Cpu, None)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim:ts=4:sw=4:et
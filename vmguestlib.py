@@ -14,8 +14,17 @@
 
 ### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
 
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 from ctypes import *
-from ctypes.util import find_library
+
+try:
+    from queue import Empty, LifoQueue
+except ImportError:
+    from Queue import Empty, LifoQueue
 
 __author__ = 'Dag Wieers <dag@wieers.com>'
 __version__ = '0.1.2'
@@ -23,16 +32,71 @@ __version_info__ = tuple([ int(d) for d in __version__.split('.') ])
 __license__ = 'GNU General Public License (GPL)'
 
 # TODO: Implement support for Windows and MacOSX, improve Linux support ?
-if find_library('vmGuestLib'):
-    vmGuestLib = CDLL(find_library('vmGuestLib'))
-elif find_library('guestlib'):
-    vmGuestLib = CDLL(find_library('guestlib'))
-#elif os.path.exists('/usr/lib/vmware-tools/lib/libvmGuestLib.so/libvmGuestLib.so'):
-#    vmGuestLib = CDLL('/usr/lib/vmware-tools/lib/libvmGuestLib.so/libvmGuestLib.so')
-#elif os.path.exists('%PROGRAMFILES%\\VMware\\VMware Tools\\Guest SDK\\vmStatsProvider\win32\\vmGuestLib.dll'):
-#    vmGuestLib = CDLL('%PROGRAMFILES%\\VMware\\VMware Tools\\Guest SDK\\vmStatsProvider\win32\\vmGuestLib.dll')
+# The library is only looked for and loaded by LoadLibrary(), when the first
+# VMGuestLib using it is created, so importing this module stays cheap.
+# When the library cannot be found, only a VMGuestLib using another backend
+# (like VMGuestLibSimulator) can be created.
+vmGuestLib = None
+
+# Environment variable with the path of the library (or a list of paths,
+# separated by os.pathsep) to use instead of searching for it
+VMGUESTLIB_PATH = 'VMGUESTLIB_PATH'
+
+# Locations VMware Tools and open-vm-tools install the library to, tried before
+# ctypes.util.find_library() which may have to run ldconfig or gcc
+if os.name == 'nt':
+    VMGuestLibPaths = (
+        os.path.join(os.environ.get('PROGRAMFILES', 'C:\\Program Files'), 'VMware', 'VMware Tools', 'Guest SDK', 'vmStatsProvider', 'win32', 'vmGuestLib.dll'),
+    )
 else:
-    raise Exception, 'ERROR: Cannot find vmGuestLib library in LD_LIBRARY_PATH'
+    VMGuestLibPaths = (
+        '/usr/lib/vmware-tools/lib/libvmGuestLib.so/libvmGuestLib.so',
+        '/usr/lib/vmware-tools/lib64/libvmGuestLib.so/libvmGuestLib.so',
+        '/usr/lib/vmware-tools/lib32/libvmGuestLib.so/libvmGuestLib.so',
+        '/usr/lib64/libvmGuestLib.so.0',
+        '/usr/lib/x86_64-linux-gnu/libvmGuestLib.so.0',
+        '/usr/lib/libvmGuestLib.so.0',
+    )
+
+# Path of the library once it has been found
+_LibraryPath = None
+
+def FindLibrary():
+    '''Returns the path of the vmGuestLib library, or None if it cannot be found.
+       The paths in the VMGUESTLIB_PATH environment variable are used instead of
+       VMGuestLibPaths if set, else ctypes.util.find_library() is the fallback.
+       The first path that exists is returned, or the first bare library name
+       (like libvmGuestLib.so.0) as the dynamic loader resolves those. The result
+       is cached for the lifetime of the process.'''
+    global _LibraryPath
+    if _LibraryPath is None:
+        if os.environ.get(VMGUESTLIB_PATH):
+            paths = os.environ[VMGUESTLIB_PATH].split(os.pathsep)
+        else:
+            paths = VMGuestLibPaths
+        for path in paths:
+            if path and (os.path.exists(path) or not os.path.dirname(path)):
+                _LibraryPath = path
+                break
+        else:
+            if not os.environ.get(VMGUESTLIB_PATH):
+                from ctypes.util import find_library
+                _LibraryPath = find_library('vmGuestLib') or find_library('guestlib')
+    return _LibraryPath
+
+def LoadLibrary(path=None):
+    '''Loads the vmGuestLib library from path, or from the path returned by
+       FindLibrary(), and returns it. The library is only loaded once.'''
+    global vmGuestLib
+    if vmGuestLib is None:
+        if path is None:
+            path = FindLibrary()
+        if path is None and os.environ.get(VMGUESTLIB_PATH):
+            raise Exception('ERROR: Cannot find vmGuestLib library, %s=%s does not exist' % (VMGUESTLIB_PATH, os.environ[VMGUESTLIB_PATH]))
+        if path is None:
+            raise Exception('ERROR: Cannot find vmGuestLib library in LD_LIBRARY_PATH, set %s to its path' % VMGUESTLIB_PATH)
+        vmGuestLib = CDLL(path)
+    return vmGuestLib
 
 VMGUESTLIB_ERROR_SUCCESS = 0
 VMGUESTLIB_ERROR_OTHER = 1
@@ -74,15 +138,341 @@ VMErrMsgs = (
     'The host does not support the requested statistic.',
 )
 
+# Counters that can be retrieved after VMGuestLib_UpdateInfo, in the order they
+# appear in a VMGuestLibSnapshot, together with the ctype they are returned in
+# and the documentation of their VMGuestLib.Get<Counter>() method.
+VMCounters = (
+    ('CpuLimitMHz', c_uint,
+        '''Retrieves the upperlimit of processor use in MHz available to the virtual
+           machine. For information about setting the CPU limit, see "Limits and
+           Reservations" on page 14.'''),
+    ('CpuReservationMHz', c_uint,
+        '''Retrieves the minimum processing power in MHz reserved for the virtual
+           machine. For information about setting a CPU reservation, see "Limits and
+           Reservations" on page 14.'''),
+    ('CpuShares', c_uint,
+        '''Retrieves the number of CPU shares allocated to the virtual machine. For
+           information about how an ESX server uses CPU shares to manage virtual
+           machine priority, see the vSphere Resource Management Guide.'''),
+    ('CpuStolenMs', c_uint64,
+        '''Retrieves the number of milliseconds that the virtual machine was in a
+           ready state (able to transition to a run state), but was not scheduled to run.'''),
+    ('CpuUsedMs', c_uint64,
+        '''Retrieves the number of milliseconds during which the virtual machine
+           has used the CPU. This value includes the time used by the guest
+           operating system and the time used by virtualization code for tasks for this
+           virtual machine. You can combine this value with the elapsed time
+           (VMGuestLib_GetElapsedMs) to estimate the effective virtual machine
+           CPU speed. This value is a subset of elapsedMs.'''),
+    ('ElapsedMs', c_uint64,
+        '''Retrieves the number of milliseconds that have passed in the virtual
+           machine since it last started running on the server. The count of elapsed
+           time restarts each time the virtual machine is powered on, resumed, or
+           migrated using VMotion. This value counts milliseconds, regardless of
+           whether the virtual machine is using processing power during that time.
+
+           You can combine this value with the CPU time used by the virtual machine
+           (VMGuestLib_GetCpuUsedMs) to estimate the effective virtual machine
+           CPU speed. cpuUsedMs is a subset of this value.'''),
+    ('HostCpuUsedMs', c_uint64,
+        '''Undocumented.'''),
+    ('HostMemKernOvhdMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemMappedMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemPhysFreeMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemPhysMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemSharedMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemSwappedMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemUnmappedMB', c_uint,
+        '''Undocumented.'''),
+    ('HostMemUsedMB', c_uint,
+        '''Undocumented.'''),
+    ('HostNumCpuCores', c_uint,
+        '''Undocumented.'''),
+    ('HostProcessorSpeed', c_uint,
+        '''Retrieves the speed of the ESX system's physical CPU in MHz.'''),
+    ('MemActiveMB', c_uint,
+        '''Retrieves the amount of memory the virtual machine is actively using its
+           estimated working set size.'''),
+    ('MemBalloonedMB', c_uint,
+        '''Retrieves the amount of memory that has been reclaimed from this virtual
+           machine by the vSphere memory balloon driver (also referred to as the
+           "vmmemctl" driver).'''),
+    ('MemBalloonMaxMB', c_uint,
+        '''Undocumented.'''),
+    ('MemBalloonTargetMB', c_uint,
+        '''Undocumented.'''),
+    ('MemLimitMB', c_uint,
+        '''Retrieves the upper limit of memory that is available to the virtual
+           machine. For information about setting a memory limit, see "Limits and
+           Reservations" on page 14.'''),
+    ('MemLLSwappedMB', c_uint,
+        '''Undocumented.'''),
+    ('MemMappedMB', c_uint,
+        '''Retrieves the amount of memory that is allocated to the virtual machine.
+           Memory that is ballooned, swapped, or has never been accessed is
+           excluded.'''),
+    ('MemOverheadMB', c_uint,
+        '''Retrieves the amount of "overhead" memory associated with this virtual
+           machine that is currently consumed on the host system. Overhead
+           memory is additional memory that is reserved for data structures required
+           by the virtualization layer.'''),
+    ('MemReservationMB', c_uint,
+        '''Retrieves the minimum amount of memory that is reserved for the virtual
+           machine. For information about setting a memory reservation, see "Limits
+           and Reservations" on page 14.'''),
+    ('MemSharedMB', c_uint,
+        '''Retrieves the amount of physical memory associated with this virtual
+           machine that is copy-on-write (COW) shared on the host.'''),
+    ('MemSharedSavedMB', c_uint,
+        '''Retrieves the estimated amount of physical memory on the host saved
+           from copy-on-write (COW) shared guest physical memory.'''),
+    ('MemShares', c_uint,
+        '''Retrieves the number of memory shares allocated to the virtual machine.
+           For information about how an ESX server uses memory shares to manage
+           virtual machine priority, see the vSphere Resource Management Guide.'''),
+    ('MemSwappedMB', c_uint,
+        '''Retrieves the amount of memory that has been reclaimed from this virtual
+           machine by transparently swapping guest memory to disk.'''),
+    ('MemSwapTargetMB', c_uint,
+        '''Undocumented.'''),
+    ('MemTargetSizeMB', c_uint,
+        '''Retrieves the size of the target memory allocation for this virtual machine.'''),
+    ('MemUsedMB', c_uint,
+        '''Retrieves the estimated amount of physical host memory currently
+           consumed for this virtual machine's physical memory.'''),
+    ('MemZippedMB', c_uint,
+        '''Undocumented.'''),
+    ('MemZipSavedMB', c_uint,
+        '''Undocumented.'''),
+)
+
+# Counters that only ever grow within a session, they restart when it changes
+VMCumulative = ('ElapsedMs', 'CpuUsedMs', 'CpuStolenMs', 'HostCpuUsedMs')
+
+# Immutable record holding the session ID and every counter read in one pass.
+# Counters that are not supported by the host are None.
+VMGuestLibSnapshot = namedtuple('VMGuestLibSnapshot',
+    ('SessionId', ) + tuple([ name for name, ctype, doc in VMCounters ]))
+
+# Rates derived from two consecutive snapshots by VMGuestLibRateSampler, over
+# ElapsedMs milliseconds of virtual machine time. CPU rates are percentages,
+# memory rates are in MB per second. Rates whose counters are not supported
+# by the host are None.
+VMGuestLibRates = namedtuple('VMGuestLibRates', (
+    'SessionId',
+    'ElapsedMs',
+    'CpuUsedPct',
+    'CpuStolenPct',
+    'EffectiveMHz',
+    'HostCpuUsedPct',
+    'MemBalloonedMBps',
+    'MemSwappedMBps',
+))
+
+# Contention scores computed by VMGuestLibPressureMonitor, as fractions from 0
+# (none) to 1. Memory and Cpu are the highest of the scores of their kind.
+# MemReclaimed is the part of the memory of the virtual machine that the host
+# took back by ballooning, swapping or compressing it, MemPending the part it
+# still aims to balloon or swap out and MemShortfall the part above the target
+# size the host wants to give it. CpuStolen is the part of the elapsed time the
+# virtual machine was ready to run but not scheduled, CpuCapped how much of the
+# room between the CPU reservation and the limit it uses. Scores that cannot be
+# computed are None.
+VMGuestLibPressure = namedtuple('VMGuestLibPressure', (
+    'SessionId',
+    'Memory',
+    'Cpu',
+    'MemReclaimed',
+    'MemPending',
+    'MemShortfall',
+    'CpuStolen',
+    'CpuCapped',
+))
+
+# Value of CpuLimitMHz and MemLimitMB when no limit is set
+VMUnlimited = 0xFFFFFFFF
+
+# Clock used to schedule and age samples, unaffected by system time changes
+# where available
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# Highest resolution clock available, to time calls into the library
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Types defined in vmGuestLib.h and vmSessionId.h
+VMGuestLibError = c_int
+VMGuestLibHandle = c_void_p
+VMSessionId = c_uint64
+
+# Errors that mean a counter will not become available during this session
+VMUnsupported = (VMGUESTLIB_ERROR_NOT_AVAILABLE, VMGUESTLIB_ERROR_UNSUPPORTED_VERSION)
+
+def _Unsupported(*args):
+    '''Stands in for routines that are not exported by the loaded library.'''
+    return VMGUESTLIB_ERROR_UNSUPPORTED_VERSION
+
+class VMGuestLibBackend(object):
+    '''The routines of a library exporting the vSphere Guest API, looked up once
+       and with their prototypes declared. The library can be the vmGuestLib
+       shared library loaded with ctypes, or any object exporting the same
+       VMGuestLib_* routines, like the one used by VMGuestLibSimulator.'''
+    def __init__(self, library):
+        self.library = library
+
+        self.OpenHandle = self._Prototype('VMGuestLib_OpenHandle', VMGuestLibError, POINTER(VMGuestLibHandle))
+        self.CloseHandle = self._Prototype('VMGuestLib_CloseHandle', VMGuestLibError, VMGuestLibHandle)
+        self.UpdateInfo = self._Prototype('VMGuestLib_UpdateInfo', VMGuestLibError, VMGuestLibHandle)
+        self.GetSessionId = self._Prototype('VMGuestLib_GetSessionId', VMGuestLibError, VMGuestLibHandle, POINTER(VMSessionId))
+        self.GetErrorText = self._Prototype('VMGuestLib_GetErrorText', c_char_p, VMGuestLibError)
+
+        # The counter routines are only ever called with a VMGuestLibHandle and a
+        # reference to a preallocated buffer of the exact ctype listed in VMCounters,
+        # so their argtypes are left undeclared: argument conversion would more than
+        # double the cost of every read (see bench/bench_getters.py).
+        self.Counters = tuple([ self._Prototype('VMGuestLib_Get' + name, VMGuestLibError)
+            for name, ctype, doc in VMCounters ])
+
+        # Error texts returned by VMGuestLib_GetErrorText, by error code
+        self._errorTexts = {}
+
+    def _Prototype(self, name, restype, *argtypes):
+        '''Looks up a routine in the library once and declares its prototype.'''
+        func = getattr(self.library, name, None)
+        if func is None:
+            return _Unsupported
+        func.restype = restype
+        if argtypes:
+            func.argtypes = argtypes
+        return func
+
+    def ErrorText(self, errno):
+        '''Returns the text for an error code, calling VMGuestLib_GetErrorText only
+           the first time a code is seen.'''
+        if errno not in self._errorTexts:
+            text = self.GetErrorText(errno)
+            if not isinstance(text, str):
+                text = text.decode('ascii', 'replace')
+            self._errorTexts[errno] = text
+        return self._errorTexts[errno]
+
+_DefaultBackend = None
+
+def DefaultBackend():
+    '''Returns the backend for the vmGuestLib shared library.'''
+    global _DefaultBackend
+    if _DefaultBackend is None:
+        _DefaultBackend = VMGuestLibBackend(LoadLibrary())
+    return _DefaultBackend
+
+class VMGuestLibInstrumentedBackend(VMGuestLibBackend):
+    '''Wraps the routines of another backend to count the calls to every
+       VMGuestLib_* routine, their cumulative and maximum time and the error
+       codes they returned. When a hook is given, it is called after every call
+       with the name of the routine, the time it took in seconds and its return
+       value, for instance to feed an external tracer.
+
+       Instrumentation is opt-in: only handles created with, or switched to, an
+       instrumented backend pay for it, see VMGuestLib.Instrument() and
+       Instrument().'''
+    def __init__(self, backend, hook=None):
+        self.library = backend.library
+        self.backend = backend
+        self.hook = hook
+
+        # Calls, total time, maximum time and error counts, by routine name
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        self.OpenHandle = self._Instrument('VMGuestLib_OpenHandle', backend.OpenHandle)
+        self.CloseHandle = self._Instrument('VMGuestLib_CloseHandle', backend.CloseHandle)
+        self.UpdateInfo = self._Instrument('VMGuestLib_UpdateInfo', backend.UpdateInfo)
+        self.GetSessionId = self._Instrument('VMGuestLib_GetSessionId', backend.GetSessionId)
+        self.GetErrorText = self._Instrument('VMGuestLib_GetErrorText', backend.GetErrorText, False)
+        self.Counters = tuple([ self._Instrument('VMGuestLib_Get' + name, func)
+            for (name, ctype, doc), func in zip(VMCounters, backend.Counters) ])
+
+        self._errorTexts = {}
+
+    def _Instrument(self, name, func, errors=True):
+        '''Returns a wrapper of func that records its calls under name. Only
+           routines returning a VMGuestLibError have their errors counted.'''
+        stats = self._stats[name] = [ 0, 0.0, 0.0, {} ]
+        lock = self._lock
+        def call(*args):
+            start = _clock()
+            ret = func(*args)
+            elapsed = _clock() - start
+            lock.acquire()
+            stats[0] = stats[0] + 1
+            stats[1] = stats[1] + elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+            if errors and ret != VMGUESTLIB_ERROR_SUCCESS:
+                stats[3][ret] = stats[3].get(ret, 0) + 1
+            lock.release()
+            if self.hook is not None:
+                self.hook(name, elapsed, ret)
+            return ret
+        call.__name__ = name
+        return call
+
+    def Stats(self):
+        '''Returns the number of calls, the total, average and maximum time in
+           seconds and the number of times every error code was returned, for
+           every routine that was called.'''
+        self._lock.acquire()
+        try:
+            stats = {}
+            for name, (calls, total, maximum, errors) in self._stats.items():
+                if calls:
+                    stats[name] = {
+                        'calls': calls,
+                        'total': total,
+                        'avg': total / calls,
+                        'max': maximum,
+                        'errors': dict(errors),
+                    }
+            return stats
+        finally:
+            self._lock.release()
+
+    def Reset(self):
+        '''Clears the statistics.'''
+        self._lock.acquire()
+        try:
+            for stats in self._stats.values():
+                stats[:] = [ 0, 0.0, 0.0, {} ]
+        finally:
+            self._lock.release()
+
+def Instrument(hook=None):
+    '''Instruments the default backend, so that every VMGuestLib created from
+       now on without a backend records its calls. Returns the instrumented
+       backend, whose Stats() cover all those handles.'''
+    global _DefaultBackend
+    backend = DefaultBackend()
+    if isinstance(backend, VMGuestLibInstrumentedBackend):
+        backend.hook = hook
+    else:
+        backend = _DefaultBackend = VMGuestLibInstrumentedBackend(backend, hook)
+    return backend
+
 class VMGuestLibException(Exception):
     '''Status code that indicates success orfailure. Each function returns a
        VMGuestLibError code. For information about specific error codes, see "vSphere
        Guest API Error Codes" on page 15. VMGuestLibError is an enumerated type
        defined in vmGuestLib.h.'''
-    def __init__(self, errno):
+    def __init__(self, errno, backend=None):
         self.errno = errno
-        self.GetErrorText = vmGuestLib.VMGuestLib_GetErrorText
-        self.GetErrorText.restype = c_char_p
+        if backend is None:
+            backend = DefaultBackend()
+        self.GetErrorText = backend.ErrorText
         self.message = self.GetErrorText(self.errno)
         self.strerr = VMErrMsgs[self.errno]
 
@@ -90,12 +480,27 @@ class VMGuestLibException(Exception):
         return '%s\n%s' % (self.message, self.strerr)
 
 class VMGuestLib(Structure):
-    def __init__(self):
+    def __init__(self, backend=None):
+        # Library routines used by this instance, the vmGuestLib shared library by default
+        if backend is None:
+            backend = DefaultBackend()
+        self.backend = backend
+
+        # Output buffers reused by every counter read on this handle
+        self._BindCounters()
+
+        # Callbacks for session changes, see AddSessionListener()
+        self.sid = None
+        self.sessionListeners = []
+        self.sessionChanges = 0
+
+        # Whether UpdateInfo() replaces a handle the library reports as invalid
+        self.recover = True
+        self.reopened = 0
+
         # Reference to virtualmachinedata. VMGuestLibHandle is defined in vmGuestLib.h.
         self.handle = self.OpenHandle()
 
-        self.UpdateInfo()
-
         # Unique identifier for a session. The session ID changes after a virtual machine is
         # migrated using VMotion, suspended and resumed, or reverted to a snapshot. Any of
         # these events is likely to render any information retrieved with this API invalid. You
@@ -108,8 +513,39 @@ class VMGuestLib(Structure):
         # any other virtual machines. You must always call VMGuestLib_GetSessionId after
         # calling VMGuestLib_UpdateInfo.
 
-        # VMSessionID is defined in vmSessionId.h
-        self.sid = self.GetSessionId()
+        # VMSessionID is defined in vmSessionId.h. UpdateInfo() retrieves it after
+        # every update and keeps it in self.sid.
+        self.UpdateInfo()
+
+    def _BindCounters(self):
+        '''Allocates one output buffer per counter, together with the reference
+           that is passed to the library, so reading a counter does not allocate.'''
+        self._sid = VMSessionId()
+        self._sidref = byref(self._sid)
+        self._buffers = tuple([ ctype() for name, ctype, doc in VMCounters ])
+        self._refs = tuple([ byref(counter) for counter in self._buffers ])
+        self._reads = tuple(zip(self.backend.Counters, self._refs, self._buffers))
+
+        # Counters found to be available, probed once per session ID
+        self._probed = None
+        self._available = ()
+
+    def Instrument(self, hook=None):
+        '''Records the calls made through this handle from now on, see
+           VMGuestLibInstrumentedBackend. Returns the instrumented backend.'''
+        if isinstance(self.backend, VMGuestLibInstrumentedBackend):
+            self.backend.hook = hook
+        else:
+            self.backend = VMGuestLibInstrumentedBackend(self.backend, hook)
+            self._BindCounters()
+        return self.backend
+
+    def Stats(self):
+        '''Returns the call statistics of the instrumented backend by routine
+           name, or an empty dict when the calls are not instrumented.'''
+        if isinstance(self.backend, VMGuestLibInstrumentedBackend):
+            return self.backend.Stats()
+        return {}
 
     def OpenHandle(self):
         '''Gets a handle for use with other vSphere Guest API functions. The guest library
@@ -120,18 +556,58 @@ class VMGuestLib(Structure):
         if hasattr(self, 'handle'):
             return self.handle
         else:
-            handle = c_void_p()
-            ret = vmGuestLib.VMGuestLib_OpenHandle(byref(handle))
-            if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
+            handle = VMGuestLibHandle()
+            ret = self.backend.OpenHandle(byref(handle))
+            if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
             return handle
 
     def CloseHandle(self):
         '''Releases a handle acquired with VMGuestLib_OpenHandle'''
         if hasattr(self, 'handle'):
-            ret = vmGuestLib.VMGuestLib_CloseHandle(self.handle.value)
-            if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
+            ret = self.backend.CloseHandle(self.handle)
+            if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
             del(self.handle)
 
+    def ReopenHandle(self):
+        '''Replaces the handle with a new one, for instance after the library
+           reported VMGUESTLIB_ERROR_INVALID_HANDLE, and updates its information.'''
+        self._Reopen()
+        self.UpdateInfo()
+
+    def _Reopen(self):
+        '''Closes the handle, ignoring errors as it may be invalid, and opens a
+           new one.'''
+        if hasattr(self, 'handle'):
+            try:
+                self.CloseHandle()
+            except VMGuestLibException:
+                del(self.handle)
+        self.handle = self.OpenHandle()
+        self.reopened = self.reopened + 1
+
+    def AddSessionListener(self, callback):
+        '''Calls callback(gl, old, new) with the old and new session ID whenever
+           UpdateInfo() finds that the session ID changed, after the state derived
+           from the old session was dropped.'''
+        self.sessionListeners.append(callback)
+
+    def RemoveSessionListener(self, callback):
+        self.sessionListeners.remove(callback)
+
+    def _Session(self, sid):
+        '''Records the session ID found by an update. When it changed, drops the
+           counters probed for the old session and notifies the listeners.'''
+        old = self.sid
+        if old is not None and old.value == sid:
+            return
+        self.sid = VMSessionId(sid)
+        if old is not None:
+            self.sessionChanges = self.sessionChanges + 1
+            self._probed = None
+            self._available = ()
+            for callback in list(self.sessionListeners):
+                callback(self, old.value, sid)
+
     def UpdateInfo(self):
         '''Updates information about the virtual machine. This information is associated with
            the VMGuestLibHandle.
@@ -142,316 +618,848 @@ class VMGuestLib(Structure):
 
            If your program uses multiple threads, each thread must use a different handle.
            Otherwise, you must implement a locking scheme around update calls. The vSphere
-           Guest API does not implement internal locking around access with a handle.'''
-        ret = vmGuestLib.VMGuestLib_UpdateInfo(self.handle.value)
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
+           Guest API does not implement internal locking around access with a handle.
+
+           Every update also retrieves the session ID, to detect session changes
+           (see AddSessionListener()). When the library reports the handle as
+           invalid, it is replaced by a new one and the update is retried once,
+           unless the recover attribute is False.'''
+        ret = self.backend.UpdateInfo(self.handle)
+        if ret == VMGUESTLIB_ERROR_INVALID_HANDLE and self.recover:
+            self._Reopen()
+            ret = self.backend.UpdateInfo(self.handle)
+        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
+        ret = self.backend.GetSessionId(self.handle, self._sidref)
+        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
+        self._Session(self._sid.value)
 
     def GetSessionId(self):
         '''Retrieves the VMSessionID for the current session. Call this function after calling
            VMGuestLib_UpdateInfo. If VMGuestLib_UpdateInfo has never been called,
            VMGuestLib_GetSessionId returns VMGUESTLIB_ERROR_NO_INFO.'''
-        sid = c_void_p()
-        ret = vmGuestLib.VMGuestLib_GetSessionId(self.handle.value, byref(sid))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
+        sid = VMSessionId()
+        ret = self.backend.GetSessionId(self.handle, byref(sid))
+        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
         return sid
 
-    def GetCpuLimitMHz(self):
-        '''Retrieves the upperlimit of processor use in MHz available to the virtual
-           machine. For information about setting the CPU limit, see "Limits and
-           Reservations" on page 14.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetCpuLimitMHz(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def _Probe(self, sid):
+        '''Reads every counter and remembers which ones are available for the
+           given session, returning the values read.'''
+        handle = self.handle
+        values = [ sid ]
+        available = []
+        for position, (func, ref, counter) in enumerate(self._reads):
+            ret = func(handle, ref)
+            if ret == VMGUESTLIB_ERROR_SUCCESS:
+                values.append(counter.value)
+            else:
+                values.append(None)
+            if ret not in VMUnsupported:
+                available.append((position + 1, func, ref, counter))
+        self._available = tuple(available)
+        self._probed = sid
+        return values
 
-    def GetCpuReservationMHz(self):
-        '''Retrieves the minimum processing power in MHz reserved for the virtual
-           machine. For information about setting a CPU reservation, see "Limits and
-           Reservations" on page 14.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetCpuReservationMHz(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Probe(self):
+        '''Checks which counters are available for the current session and
+           returns their names. The result is cached until the session ID changes,
+           so Snapshot() does not pay for counters the host does not support.'''
+        sid = self.GetSessionId().value
+        if sid != self._probed:
+            self._Probe(sid)
+        return tuple([ VMGuestLibSnapshot._fields[entry[0]] for entry in self._available ])
 
-    def GetCpuShares(self):
-        '''Retrieves the number of CPU shares allocated to the virtual machine. For
-           information about how an ESX server uses CPU shares to manage virtual
-           machine priority, see the vSphere Resource Management Guide.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetCpuShares(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Snapshot(self):
+        '''Reads every counter from the information retrieved by the last call to
+           VMGuestLib_UpdateInfo in a single pass and returns them as an immutable
+           VMGuestLibSnapshot. Counters that are not available on this host are
+           reported as None instead of raising a VMGuestLibException, and are no
+           longer read once they have been found missing in the current session.'''
+        ret = self.backend.GetSessionId(self.handle, self._sidref)
+        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
+        return self._Snapshot(self._sid.value)
 
-    def GetCpuStolenMs(self):
-        '''Retrieves the number of milliseconds that the virtual machine was in a
-           ready state (able to transition to a run state), but was not scheduled to run.'''
-        counter = c_uint64()
-        ret = vmGuestLib.VMGuestLib_GetCpuStolenMs(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def _Snapshot(self, sid):
+        '''Reads the available counters for a snapshot of session sid.'''
+        handle = self.handle
+        if sid != self._probed:
+            return VMGuestLibSnapshot._make(self._Probe(sid))
+        values = [ None ] * len(VMGuestLibSnapshot._fields)
+        values[0] = sid
+        for position, func, ref, counter in self._available:
+            if func(handle, ref) == VMGUESTLIB_ERROR_SUCCESS:
+                values[position] = counter.value
+        return VMGuestLibSnapshot._make(values)
 
-    def GetCpuUsedMs(self):
-        '''Retrieves the number of milliseconds during which the virtual machine
-           has used the CPU. This value includes the time used by the guest
-           operating system and the time used by virtualization code for tasks for this
-           virtual machine. You can combine this value with the elapsed time
-           (VMGuestLib_GetElapsedMs) to estimate the effective virtual machine
-           CPU speed. This value is a subset of elapsedMs.'''
-        counter = c_uint64()
-        ret = vmGuestLib.VMGuestLib_GetCpuUsedMs(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
+    def UpdateAndSnapshot(self):
+        '''Updates information about the virtual machine and returns a
+           VMGuestLibSnapshot of all counters.'''
+        self.UpdateInfo()
+        # The update just retrieved the session ID
+        return self._Snapshot(self.sid.value)
+
+def _CounterGetter(index, name, doc):
+    '''Builds the VMGuestLib.Get<Counter>() method for a VMCounters entry.'''
+    def getter(self):
+        func, ref, counter = self._reads[index]
+        ret = func(self.handle, ref)
+        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret, self.backend)
         return counter.value
+    getter.__name__ = 'Get' + name
+    getter.__doc__ = doc
+    return getter
 
-    def GetElapsedMs(self):
-        '''Retrieves the number of milliseconds that have passed in the virtual
-           machine since it last started running on the server. The count of elapsed
-           time restarts each time the virtual machine is powered on, resumed, or
-           migrated using VMotion. This value counts milliseconds, regardless of
-           whether the virtual machine is using processing power during that time.
+for index, (name, ctype, doc) in enumerate(VMCounters):
+    setattr(VMGuestLib, 'Get' + name, _CounterGetter(index, name, doc))
+del(index, name, ctype, doc)
 
-           You can combine this value with the CPU time used by the virtual machine
-           (VMGuestLib_GetCpuUsedMs) to estimate the effective virtual machine
-           CPU speed. cpuUsedMs is a subset of this value.'''
-        counter = c_uint64()
-        ret = vmGuestLib.VMGuestLib_GetElapsedMs(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+class VMGuestLibRateSampler(object):
+    '''Computes VMGuestLibRates from consecutive snapshots. Only the previous
+       snapshot is kept, so every sample costs the same regardless of how long
+       the sampler runs. The counters are read into the buffers bound to the
+       handle, but every sample returns a new snapshot and VMGuestLibRates: they
+       are immutable so VMGuestLibSampler can hand them to other threads
+       without locking, which reused records would break.
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostCpuUsedMs(self):
-        '''Undocumented.'''
-        counter = c_uint64()
-        ret = vmGuestLib.VMGuestLib_GetHostCpuUsedMs(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+       The cumulative counters restart when the session ID changes (after a
+       VMotion, a suspend and resume or a snapshot revert) and when the virtual
+       machine is powered on again. When that is detected, the sample is used
+       as the new starting point instead of producing a bogus rate.'''
+    def __init__(self, gl=None):
+        self.gl = gl
+        self.previous = None
+        self.resets = 0
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemKernOvhdMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemKernOvhdMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Reset(self):
+        '''Forgets the previous snapshot, the next sample starts over.'''
+        self.previous = None
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemMappedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemMappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Update(self, snapshot):
+        '''Returns the rates between the previous snapshot and this one, or None
+           for the first snapshot and after the counters were reset.'''
+        previous = self.previous
+        self.previous = snapshot
+        if previous is None:
+            return None
+        if snapshot.SessionId != previous.SessionId or _Backwards(previous, snapshot):
+            self.resets = self.resets + 1
+            return None
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemPhysFreeMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemPhysFreeMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        if snapshot.ElapsedMs is None or previous.ElapsedMs is None:
+            elapsed = None
+        else:
+            elapsed = snapshot.ElapsedMs - previous.ElapsedMs
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemPhysMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemPhysMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        usedPct = _Rate(previous.CpuUsedMs, snapshot.CpuUsedMs, elapsed, 100.0)
+        if usedPct is None or snapshot.HostProcessorSpeed is None:
+            effectiveMhz = None
+        else:
+            effectiveMhz = snapshot.HostProcessorSpeed * usedPct / 100.0
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemSharedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemSharedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        return VMGuestLibRates(
+            snapshot.SessionId,
+            elapsed,
+            usedPct,
+            _Rate(previous.CpuStolenMs, snapshot.CpuStolenMs, elapsed, 100.0),
+            effectiveMhz,
+            _Rate(previous.HostCpuUsedMs, snapshot.HostCpuUsedMs, elapsed, 100.0),
+            _Rate(previous.MemBalloonedMB, snapshot.MemBalloonedMB, elapsed, 1000.0),
+            _Rate(previous.MemSwappedMB, snapshot.MemSwappedMB, elapsed, 1000.0),
+        )
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemSwappedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemSwappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Sample(self):
+        '''Updates information about the virtual machine and returns the rates
+           since the previous sample.'''
+        return self.Update(self.gl.UpdateAndSnapshot())
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemUnmappedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemUnmappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+def _Rate(old, new, elapsed, scale):
+    '''Returns the change of a counter per elapsed millisecond, times scale.'''
+    if old is None or new is None or elapsed is None:
+        return None
+    # Make sure that if time stands still we don't end up in infinity
+    if elapsed == 0:
+        return 0.0
+    return (new - old) * scale / elapsed
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostMemUsedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostMemUsedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+def _Backwards(previous, snapshot):
+    '''Tells whether any cumulative counter went backwards between snapshots.'''
+    for name in VMCumulative:
+        old = getattr(previous, name)
+        new = getattr(snapshot, name)
+        if old is not None and new is not None and new < old:
+            return True
+    return False
 
-    # TODO: Undocumented routine, needs testing
-    def GetHostNumCpuCores(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostNumCpuCores(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+class VMGuestLibPressureMonitor(object):
+    '''Turns every sample into VMGuestLibPressure scores and calls the
+       subscribers whose threshold was crossed. Memory scores only need the
+       snapshot, CPU scores also need the rates, so they are None for the first
+       sample of a session.
 
-    def GetHostProcessorSpeed(self):
-        '''Retrieves the speed of the ESX system's physical CPU in MHz.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetHostProcessorSpeed(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+       The scores can be smoothed exponentially: with alpha below 1, every new
+       score counts for alpha and the previous smoothed score for 1 - alpha.
+       Every sample takes the same constant time, whatever the history.'''
+    def __init__(self, gl=None, alpha=1.0):
+        self.sampler = VMGuestLibRateSampler(gl)
+        self.alpha = alpha
+        self.pressure = None
+        self._subscriptions = []
 
-    def GetMemActiveMB(self):
-        '''Retrieves the amount of memory the virtual machine is actively using its
-           estimated working set size.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemActiveMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Subscribe(self, field, on, callback, off=None):
+        '''Calls callback(pressure, True) when the score in field (Memory, Cpu or
+           any other VMGuestLibPressure field) reaches on, and callback(pressure,
+           False) once it dropped below off again, on by default. A lower off
+           keeps a score hovering around the threshold from firing on every
+           sample. Returns the subscription, for Unsubscribe().'''
+        if field not in VMGuestLibPressure._fields[1:]:
+            raise ValueError('Unknown pressure score %s' % field)
+        if off is None:
+            off = on
+        if off > on:
+            raise ValueError('off threshold %s is above on threshold %s' % (off, on))
+        # Position of the score, thresholds, callback and whether it is on
+        subscription = [ VMGuestLibPressure._fields.index(field), on, off, callback, False ]
+        self._subscriptions.append(subscription)
+        return subscription
 
-    def GetMemBalloonedMB(self):
-        '''Retrieves the amount of memory that has been reclaimed from this virtual
-           machine by the vSphere memory balloon driver (also referred to as the
-           "vmmemctl" driver).'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemBalloonedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Unsubscribe(self, subscription):
+        self._subscriptions.remove(subscription)
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemBalloonMaxMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemBalloonMaxMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Sample(self):
+        '''Updates information about the virtual machine and evaluates it.'''
+        rates = self.sampler.Sample()
+        return self.Update(self.sampler.previous, rates)
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemBalloonTargetMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemBalloonTargetMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Update(self, snapshot, rates=None):
+        '''Computes the scores of a snapshot and the rates since the previous
+           one, smooths them, calls the subscribers and returns them.'''
+        pressure = _Pressure(snapshot, rates)
+        previous = self.pressure
+        if self.alpha < 1.0 and previous is not None and previous.SessionId == pressure.SessionId:
+            alpha = self.alpha
+            values = [ pressure.SessionId ]
+            for old, new in zip(previous[1:], pressure[1:]):
+                if old is None or new is None:
+                    values.append(new)
+                else:
+                    values.append(alpha * new + (1.0 - alpha) * old)
+            pressure = VMGuestLibPressure._make(values)
+        self.pressure = pressure
 
-    def GetMemLimitMB(self):
-        '''Retrieves the upper limit of memory that is available to the virtual
-           machine. For information about setting a memory limit, see "Limits and
-           Reservations" on page 14.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemLimitMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        for subscription in list(self._subscriptions):
+            index, on, off, callback, active = subscription
+            score = pressure[index]
+            if score is None:
+                continue
+            if not active and score >= on:
+                subscription[4] = True
+                callback(pressure, True)
+            elif active and score < off:
+                subscription[4] = False
+                callback(pressure, False)
+        return pressure
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemLLSwappedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemLLSwappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+def _Fraction(part, whole):
+    '''Returns part / whole clamped to [0, 1], None when it is unknown.'''
+    if part is None or not whole:
+        return None
+    return min(max(float(part) / whole, 0.0), 1.0)
 
-    def GetMemMappedMB(self):
-        '''Retrieves the amount of memory that is allocated to the virtual machine.
-           Memory that is ballooned, swapped, or has never been accessed is
-           excluded.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemMappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+def _Highest(*scores):
+    scores = [ score for score in scores if score is not None ]
+    if not scores:
+        return None
+    return max(scores)
 
-    def GetMemOverheadMB(self):
-        '''Retrieves the amount of "overhead" memory associated with this virtual
-           machine that is currently consumed on the host system. Overhead
-           memory is additional memory that is reserved for data structures required
-           by the virtualization layer.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemOverheadMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+def _Pressure(snapshot, rates):
+    '''Computes the VMGuestLibPressure of a snapshot and its rates.'''
+    ballooned = snapshot.MemBalloonedMB or 0
+    swapped = snapshot.MemSwappedMB or 0
+    reclaimed = ballooned + swapped + (snapshot.MemZippedMB or 0)
+    # The memory the virtual machine would have without any reclamation
+    total = None
+    if snapshot.MemMappedMB is not None:
+        total = snapshot.MemMappedMB + reclaimed
 
-    def GetMemReservationMB(self):
-        '''Retrieves the minimum amount of memory that is reserved for the virtual
-           machine. For information about setting a memory reservation, see "Limits
-           and Reservations" on page 14.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemReservationMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    memReclaimed = _Fraction(reclaimed, total)
+    pending = None
+    if snapshot.MemBalloonTargetMB is not None or snapshot.MemSwapTargetMB is not None:
+        pending = max((snapshot.MemBalloonTargetMB or 0) - ballooned, 0) + max((snapshot.MemSwapTargetMB or 0) - swapped, 0)
+    memPending = _Fraction(pending, total)
+    shortfall = None
+    if snapshot.MemTargetSizeMB is not None and total is not None:
+        target = snapshot.MemTargetSizeMB
+        if snapshot.MemLimitMB is not None and snapshot.MemLimitMB != VMUnlimited:
+            target = min(target, snapshot.MemLimitMB)
+        shortfall = total - target
+    memShortfall = _Fraction(shortfall, total)
 
-    def GetMemSharedMB(self):
-        '''Retrieves the amount of physical memory associated with this virtual
-           machine that is copy-on-write (COW) shared on the host.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemSharedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    cpuStolen = cpuCapped = None
+    if rates is not None:
+        # Stolen time is summed over all virtual CPUs and may exceed the
+        # elapsed time, the score saturates at 1
+        cpuStolen = _Fraction(rates.CpuStolenPct, 100.0)
+        limit = snapshot.CpuLimitMHz
+        if rates.EffectiveMHz is not None and limit is not None and limit != VMUnlimited:
+            reservation = min(snapshot.CpuReservationMHz or 0, limit)
+            if limit > reservation:
+                cpuCapped = _Fraction(rates.EffectiveMHz - reservation, limit - reservation)
+            elif limit:
+                cpuCapped = _Fraction(rates.EffectiveMHz, limit)
 
-    def GetMemSharedSavedMB(self):
-        '''Retrieves the estimated amount of physical memory on the host saved
-           from copy-on-write (COW) shared guest physical memory.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemSharedSavedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    return VMGuestLibPressure(
+        snapshot.SessionId,
+        _Highest(memReclaimed, memPending, memShortfall),
+        _Highest(cpuStolen, cpuCapped),
+        memReclaimed,
+        memPending,
+        memShortfall,
+        cpuStolen,
+        cpuCapped,
+    )
 
-    def GetMemShares(self):
-        '''Retrieves the number of memory shares allocated to the virtual machine.
-           For information about how an ESX server uses memory shares to manage
-           virtual machine priority, see the vSphere Resource Management Guide.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemShares(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+class VMGuestLibSampler(object):
+    '''Samples the virtual machine from a background thread. The thread owns the
+       only handle, calls VMGuestLib_UpdateInfo every interval seconds and
+       publishes the resulting snapshot and rates. Any number of threads can
+       read the latest ones with Latest() and LatestRates(), which neither lock
+       nor call into the library.
 
-    def GetMemSwappedMB(self):
-        '''Retrieves the amount of memory that has been reclaimed from this virtual
-           machine by transparently swapping guest memory to disk.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemSwappedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+       Readers never get data older than staleness seconds (three intervals by
+       default): if the thread could not publish in time, for instance because
+       VMGuestLib_UpdateInfo keeps failing, None is returned instead and the last
+       error is kept in the error attribute.'''
+    def __init__(self, interval=1.0, staleness=None, backend=None):
+        self.interval = interval
+        if staleness is None:
+            staleness = 3 * interval
+        self.staleness = staleness
+        self.gl = VMGuestLib(backend)
+        self.sampler = VMGuestLibRateSampler(self.gl)
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemSwapTargetMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemSwapTargetMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        # Published as one tuple of (time, snapshot, rates), so readers always
+        # see a snapshot together with its own rates
+        self.published = None
+        self.error = None
+        self.samples = 0
 
-    def GetMemTargetSizeMB(self):
-        '''Retrieves the size of the target memory allocation for this virtual machine.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemTargetSizeMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+        self._stop = threading.Event()
+        self._thread = None
 
-    def GetMemUsedMB(self):
-        '''Retrieves the estimated amount of physical host memory currently
-           consumed for this virtual machine's physical memory.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemUsedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def _Sample(self):
+        try:
+            snapshot = self.gl.UpdateAndSnapshot()
+        except VMGuestLibException as e:
+            self.error = e
+            return
+        rates = self.sampler.Update(snapshot)
+        self.published = (_monotonic(), snapshot, rates)
+        self.samples = self.samples + 1
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemZippedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemZippedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def _Run(self):
+        deadline = _monotonic()
+        while not self._stop.is_set():
+            # Sample at fixed times so the interval does not drift, skipping the
+            # ticks that were missed when sampling took too long
+            deadline = deadline + self.interval
+            wait = deadline - _monotonic()
+            if wait < 0:
+                deadline = _monotonic()
+                wait = 0
+            self._stop.wait(wait)
+            if not self._stop.is_set():
+                self._Sample()
 
-    # TODO: Undocumented routine, needs testing
-    def GetMemZipSavedMB(self):
-        '''Undocumented.'''
-        counter = c_uint()
-        ret = vmGuestLib.VMGuestLib_GetMemZipSavedMB(self.handle.value, byref(counter))
-        if ret != VMGUESTLIB_ERROR_SUCCESS: raise VMGuestLibException(ret)
-        return counter.value
+    def Start(self):
+        '''Takes a first sample and starts the background thread, reopening the
+           handle if the sampler was stopped before.'''
+        if self._thread is None:
+            if not hasattr(self.gl, 'handle'):
+                self.gl.handle = self.gl.OpenHandle()
+            self._Sample()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._Run, name='VMGuestLibSampler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def Stop(self):
+        '''Stops the background thread and releases the handle until Start()
+           is called again.'''
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.gl.CloseHandle()
+
+    def Age(self):
+        '''Returns the number of seconds since the latest sample was taken, or
+           None if there is none.'''
+        published = self.published
+        if published is None:
+            return None
+        return _monotonic() - published[0]
+
+    def Latest(self):
+        '''Returns the latest VMGuestLibSnapshot, or None if it is too old.'''
+        published = self.published
+        if published is None or _monotonic() - published[0] > self.staleness:
+            return None
+        return published[1]
+
+    def LatestRates(self):
+        '''Returns the VMGuestLibRates of the latest sample, or None if it is too
+           old or the counters just restarted.'''
+        published = self.published
+        if published is None or _monotonic() - published[0] > self.staleness:
+            return None
+        return published[2]
+
+class VMGuestLibPool(object):
+    '''A bounded pool of VMGuestLib instances, each with its own handle, so the
+       threads of a thread pool can read counters concurrently without sharing a
+       handle or a lock around it. Handles are only opened when needed, up to
+       size of them.
+
+       A checked out instance is used by a single thread until it is checked in
+       again. On checkout, its handle is checked with VMGuestLib_GetSessionId and
+       reopened if the library reports VMGUESTLIB_ERROR_INVALID_HANDLE.'''
+    def __init__(self, size=4, backend=None):
+        self.size = size
+        self.backend = backend
+        self.reopened = 0
+
+        # Most recently used instances are handed out first
+        self._idle = LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def Checkout(self, timeout=None):
+        '''Returns an idle VMGuestLib, opening a new handle if fewer than size are
+           open, or else waiting up to timeout seconds (forever if None) for one
+           to be checked in. Raises Empty when the timeout expires.'''
+        try:
+            gl = self._idle.get_nowait()
+        except Empty:
+            self._lock.acquire()
+            try:
+                create = self._opened < self.size
+                if create:
+                    self._opened = self._opened + 1
+            finally:
+                self._lock.release()
+            if not create:
+                gl = self._idle.get(timeout=timeout)
+            else:
+                try:
+                    return VMGuestLib(self.backend)
+                except:
+                    self._Discard()
+                    raise
+        try:
+            gl.GetSessionId()
+        except VMGuestLibException as e:
+            if e.errno != VMGUESTLIB_ERROR_INVALID_HANDLE:
+                # Do not hand out a handle in an unknown state, nor lose its slot
+                try:
+                    gl.CloseHandle()
+                except VMGuestLibException:
+                    pass
+                self._Discard()
+                raise
+            try:
+                gl.ReopenHandle()
+            except:
+                self._Discard()
+                raise
+            self.reopened = self.reopened + 1
+        return gl
+
+    def Checkin(self, gl):
+        '''Returns a VMGuestLib obtained with Checkout() to the pool.'''
+        if hasattr(gl, 'handle'):
+            self._idle.put(gl)
+        else:
+            self._Discard()
+
+    def _Discard(self):
+        '''Makes room for a new handle when one could not be returned.'''
+        self._lock.acquire()
+        try:
+            self._opened = self._opened - 1
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def Handle(self, timeout=None):
+        '''Checks out a VMGuestLib for the duration of a with statement.'''
+        gl = self.Checkout(timeout)
+        try:
+            yield gl
+        finally:
+            self.Checkin(gl)
+
+    def Close(self):
+        '''Releases the handles of all idle instances.'''
+        while True:
+            try:
+                gl = self._idle.get_nowait()
+            except Empty:
+                break
+            self._Discard()
+            gl.CloseHandle()
+
+class VMGuestLibCache(object):
+    '''Shares a single handle, and the snapshot of its last update, between all
+       the code of a process. A snapshot younger than ttl seconds is returned
+       as is; only older ones cause a new VMGuestLib_UpdateInfo, made by one
+       thread at a time. The hits, misses and the time spent in the real updates
+       are counted to help tuning the ttl, see Stats().'''
+    def __init__(self, ttl=1.0, backend=None):
+        self.ttl = ttl
+        self.backend = backend
+        self.gl = None
+
+        # Published as one tuple of (time, snapshot)
+        self.cached = None
+
+        self.hits = 0
+        self.misses = 0
+        self.updateTime = 0.0
+        self.updateMax = 0.0
+        self.updateLast = 0.0
+        self._lock = threading.Lock()
+
+    def Snapshot(self):
+        '''Returns a VMGuestLibSnapshot that is at most ttl seconds old.'''
+        cached = self.cached
+        if cached is not None and _monotonic() - cached[0] < self.ttl:
+            self.hits = self.hits + 1
+            return cached[1]
+        self._lock.acquire()
+        try:
+            # Another thread may have updated while this one was waiting
+            cached = self.cached
+            if cached is not None and _monotonic() - cached[0] < self.ttl:
+                self.hits = self.hits + 1
+                return cached[1]
+            start = _monotonic()
+            if self.gl is None:
+                self.gl = VMGuestLib(self.backend)
+                snapshot = self.gl.Snapshot()
+            else:
+                snapshot = self.gl.UpdateAndSnapshot()
+            end = _monotonic()
+            self.cached = (end, snapshot)
+            self.misses = self.misses + 1
+            self.updateLast = end - start
+            self.updateTime = self.updateTime + self.updateLast
+            self.updateMax = max(self.updateMax, self.updateLast)
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def Stats(self):
+        '''Returns the number of cache hits and misses, and the average, maximum
+           and last time in seconds taken by the updates the misses caused.'''
+        if self.misses:
+            average = self.updateTime / self.misses
+        else:
+            average = 0.0
+        return {
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'update_avg': average,
+            'update_max': self.updateMax,
+            'update_last': self.updateLast,
+        }
+
+    def Close(self):
+        '''Releases the shared handle, a new one is opened when needed.'''
+        self._lock.acquire()
+        try:
+            if self.gl is not None:
+                self.gl.CloseHandle()
+                self.gl = None
+            self.cached = None
+        finally:
+            self._lock.release()
+
+# Process-wide caches, by backend (None for the vmGuestLib library)
+_SharedCaches = {}
+_SharedCachesLock = threading.Lock()
+
+def SharedCache(ttl=None, backend=None):
+    '''Returns the process-wide VMGuestLibCache for a backend, creating it with a
+       ttl of one second unless another ttl is given. Giving a ttl for an existing
+       cache changes it.'''
+    _SharedCachesLock.acquire()
+    try:
+        if backend not in _SharedCaches:
+            _SharedCaches[backend] = VMGuestLibCache(1.0, backend)
+        cache = _SharedCaches[backend]
+        if ttl is not None:
+            cache.ttl = ttl
+        return cache
+    finally:
+        _SharedCachesLock.release()
+
+class CachedVMGuestLib(VMGuestLib):
+    '''A VMGuestLib reading from a VMGuestLibCache, the process-wide one by
+       default, instead of from a handle of its own. UpdateInfo() only calls
+       into the library when the cached snapshot is older than the ttl of the
+       cache, and the getters read from the snapshot taken by the last
+       UpdateInfo(). Counters the host does not support raise a
+       VMGuestLibException with VMGUESTLIB_ERROR_NOT_AVAILABLE.'''
+    def __init__(self, cache=None):
+        if cache is None:
+            cache = SharedCache()
+        self.cache = cache
+        self.sid = None
+        self.sessionListeners = []
+        self.sessionChanges = 0
+        self.UpdateInfo()
+
+    @property
+    def backend(self):
+        if self.cache.backend is None:
+            return DefaultBackend()
+        return self.cache.backend
+
+    def OpenHandle(self):
+        '''The handle is owned by the cache.'''
+        pass
+
+    def CloseHandle(self):
+        '''The handle is owned by the cache, see VMGuestLibCache.Close().'''
+        pass
+
+    def Instrument(self, hook=None):
+        '''Instruments the handle of the cache, which all its readers share, and
+           the handles it opens later on. Returns the instrumented backend, whose
+           statistics Stats() returns from then on.'''
+        cache = self.cache
+        cache._lock.acquire()
+        try:
+            if cache.gl is None:
+                cache.gl = VMGuestLib(cache.backend)
+            backend = cache.gl.Instrument(hook)
+            cache.backend = backend
+        finally:
+            cache._lock.release()
+        return backend
+
+    def UpdateInfo(self):
+        '''Takes the snapshot of the cache, updating it if it is older than its ttl.'''
+        self.snapshot = self.cache.Snapshot()
+        self._Session(self.snapshot.SessionId)
+
+    def GetSessionId(self):
+        '''Returns the VMSessionID of the last update.'''
+        return VMSessionId(self.snapshot.SessionId)
+
+    def Snapshot(self):
+        '''Returns the VMGuestLibSnapshot of the last update.'''
+        return self.snapshot
+
+    def UpdateAndSnapshot(self):
+        self.UpdateInfo()
+        return self.snapshot
+
+    def Probe(self):
+        '''Returns the names of the counters in the last snapshot.'''
+        return tuple([ name for name, value in zip(VMGuestLibSnapshot._fields[1:], self.snapshot[1:]) if value is not None ])
+
+def _CachedGetter(index, name, doc):
+    '''Builds the CachedVMGuestLib.Get<Counter>() method for a VMCounters entry.'''
+    def getter(self):
+        value = self.snapshot[index + 1]
+        if value is None: raise VMGuestLibException(VMGUESTLIB_ERROR_NOT_AVAILABLE, self.backend)
+        return value
+    getter.__name__ = 'Get' + name
+    getter.__doc__ = doc
+    return getter
+
+for index, (name, ctype, doc) in enumerate(VMCounters):
+    setattr(CachedVMGuestLib, 'Get' + name, _CachedGetter(index, name, doc))
+del(index, name, ctype, doc)
+
+class _SimulatedLibrary(object):
+    '''Exports the VMGuestLib_* routines as ctypes callbacks that replay a
+       timeline of samples, so they are called exactly like the routines of the
+       vmGuestLib shared library.'''
+    def __init__(self, samples, loop):
+        self.samples = [ self._Normalize(sample) for sample in samples ]
+        self.loop = loop
+
+        # Position in the timeline of every open handle, -1 before the first update
+        self.handles = {}
+        self.lastHandle = 0
+        self.errorTexts = {}
+
+        self.VMGuestLib_OpenHandle = CFUNCTYPE(VMGuestLibError, POINTER(VMGuestLibHandle))(self.OpenHandle)
+        self.VMGuestLib_CloseHandle = CFUNCTYPE(VMGuestLibError, VMGuestLibHandle)(self.CloseHandle)
+        self.VMGuestLib_UpdateInfo = CFUNCTYPE(VMGuestLibError, VMGuestLibHandle)(self.UpdateInfo)
+        self.VMGuestLib_GetSessionId = CFUNCTYPE(VMGuestLibError, VMGuestLibHandle, POINTER(VMSessionId))(self.GetSessionId)
+        self.VMGuestLib_GetErrorText = CFUNCTYPE(c_void_p, VMGuestLibError)(self.GetErrorText)
+        for name, ctype, doc in VMCounters:
+            routine = CFUNCTYPE(VMGuestLibError, VMGuestLibHandle, POINTER(ctype))(self._Counter(name))
+            setattr(self, 'VMGuestLib_Get' + name, routine)
+
+    def _Normalize(self, sample):
+        '''Accepts a sample as a dictionary or as a recorded VMGuestLibSnapshot.'''
+        if hasattr(sample, '_asdict'):
+            sample = sample._asdict()
+        return dict([ (key, value) for key, value in sample.items() if value is not None ])
+
+    def _Sample(self, handle):
+        '''Returns an error code and the sample the handle was last updated to.'''
+        if handle not in self.handles:
+            return VMGUESTLIB_ERROR_INVALID_HANDLE, None
+        position = self.handles[handle]
+        if position < 0:
+            return VMGUESTLIB_ERROR_NO_INFO, None
+        return VMGUESTLIB_ERROR_SUCCESS, self.samples[position]
+
+    def _Error(self, sample, routine):
+        '''Returns the error code a sample prescribes for a routine, if any.'''
+        return sample.get('Errors', {}).get(routine, VMGUESTLIB_ERROR_SUCCESS)
+
+    def OpenHandle(self, handle):
+        self.lastHandle = self.lastHandle + 1
+        self.handles[self.lastHandle] = -1
+        handle[0] = self.lastHandle
+        return VMGUESTLIB_ERROR_SUCCESS
+
+    def CloseHandle(self, handle):
+        if handle not in self.handles:
+            return VMGUESTLIB_ERROR_INVALID_HANDLE
+        del(self.handles[handle])
+        return VMGUESTLIB_ERROR_SUCCESS
+
+    def UpdateInfo(self, handle):
+        if handle not in self.handles:
+            return VMGUESTLIB_ERROR_INVALID_HANDLE
+        if not self.samples:
+            return VMGUESTLIB_ERROR_NOT_RUNNING_IN_VM
+        position = self.handles[handle] + 1
+        if position >= len(self.samples):
+            if self.loop:
+                position = 0
+            else:
+                position = len(self.samples) - 1
+        self.handles[handle] = position
+        return self._Error(self.samples[position], 'UpdateInfo')
+
+    def GetSessionId(self, handle, sid):
+        ret, sample = self._Sample(handle)
+        if ret != VMGUESTLIB_ERROR_SUCCESS:
+            return ret
+        ret = self._Error(sample, 'GetSessionId')
+        if ret == VMGUESTLIB_ERROR_SUCCESS:
+            sid[0] = sample.get('SessionId', 1)
+        return ret
+
+    def GetErrorText(self, errno):
+        if errno not in self.errorTexts:
+            if 0 <= errno < len(VMErrors):
+                text = VMErrors[errno]
+            else:
+                text = 'Unknown error %d' % errno
+            self.errorTexts[errno] = create_string_buffer(text.encode('ascii'))
+        return addressof(self.errorTexts[errno])
+
+    def _Counter(self, name):
+        '''Builds the VMGuestLib_Get<Counter> routine for a counter.'''
+        routine = 'Get' + name
+        def counter(handle, value):
+            ret, sample = self._Sample(handle)
+            if ret != VMGUESTLIB_ERROR_SUCCESS:
+                return ret
+            ret = self._Error(sample, routine)
+            if ret != VMGUESTLIB_ERROR_SUCCESS:
+                return ret
+            if name not in sample:
+                return VMGUESTLIB_ERROR_UNSUPPORTED_VERSION
+            value[0] = sample[name]
+            return VMGUESTLIB_ERROR_SUCCESS
+        return counter
+
+class VMGuestLibSimulator(VMGuestLibBackend):
+    '''Deterministic backend that replays a timeline of samples instead of
+       querying the hypervisor, for testing and benchmarking off a VMware guest.
+
+       Every sample is a dictionary mapping counter names (as in VMCounters) and
+       'SessionId' to their values, or a recorded VMGuestLibSnapshot. Each call to
+       VMGuestLib_UpdateInfo moves a handle to the next sample; at the end of the
+       timeline the last sample is repeated, or the timeline restarts if loop is
+       set. Counters missing from a sample are reported as
+       VMGUESTLIB_ERROR_UNSUPPORTED_VERSION, and a sample can make routines fail
+       by mapping their names (like 'UpdateInfo' or 'GetMemZippedMB') to an
+       error code in its 'Errors' dictionary.'''
+    def __init__(self, samples, loop=False):
+        VMGuestLibBackend.__init__(self, _SimulatedLibrary(samples, loop))
+
+def SyntheticTimeline(count, interval=1000, sessions=1, seed=0):
+    '''Returns count samples, interval milliseconds apart, of a virtual machine
+       with a varying CPU load and memory being ballooned and swapped. The
+       timeline is split into the given number of sessions, each starting with a
+       new session ID and with the elapsed and CPU time counters reset, as after a
+       VMotion. The same seed always gives the same timeline.'''
+    import random
+    rand = random.Random(seed)
+    length = max(1, -(-count // max(1, sessions)))
+    samples = []
+    for index in range(count):
+        if index % length == 0:
+            sid = int(rand.random() * 0x7FFFFFFFFFFF) + 1
+            elapsed = used = stolen = hostused = 0
+            ballooned = swapped = 0
+        load = rand.random()
+        elapsed = elapsed + interval
+        used = used + int(interval * load)
+        stolen = stolen + int(interval * (1 - load) * rand.random() * 0.1)
+        hostused = hostused + int(interval * 16 * (0.3 + 0.4 * rand.random()))
+        ballooned = min(2048, max(0, ballooned + int(rand.random() * 144) - 64))
+        swapped = min(512, max(0, swapped + int(rand.random() * 18) - 8))
+        samples.append({
+            'SessionId': sid,
+            'CpuLimitMHz': 0xFFFFFFFF,
+            'CpuReservationMHz': 0,
+            'CpuShares': 2000,
+            'CpuStolenMs': stolen,
+            'CpuUsedMs': used,
+            'ElapsedMs': elapsed,
+            'HostCpuUsedMs': hostused,
+            'HostMemKernOvhdMB': 1024,
+            'HostMemMappedMB': 180000,
+            'HostMemPhysFreeMB': 16384,
+            'HostMemPhysMB': 262144,
+            'HostMemSharedMB': 20480,
+            'HostMemSwappedMB': 0,
+            'HostMemUnmappedMB': 4096,
+            'HostMemUsedMB': 245760,
+            'HostNumCpuCores': 16,
+            'HostProcessorSpeed': 2932,
+            'MemActiveMB': int(4096 * (0.1 + 0.3 * load)),
+            'MemBalloonedMB': ballooned,
+            'MemBalloonMaxMB': 2600,
+            'MemBalloonTargetMB': ballooned,
+            'MemLimitMB': 0xFFFFFFFF,
+            'MemLLSwappedMB': 0,
+            'MemMappedMB': 8192 - ballooned - swapped,
+            'MemOverheadMB': 60,
+            'MemReservationMB': 0,
+            'MemSharedMB': 512,
+            'MemSharedSavedMB': 480,
+            'MemShares': 81920,
+            'MemSwappedMB': swapped,
+            'MemSwapTargetMB': swapped,
+            'MemTargetSizeMB': 8192 - ballooned,
+            'MemUsedMB': 8192 - ballooned - swapped - 480,
+            'MemZippedMB': 0,
+            'MemZipSavedMB': 0,
+        })
+    return samples
 
 # vim:ts=4:sw=4:et
\ No newline at end of file
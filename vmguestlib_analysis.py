@@ -0,0 +1,225 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Vectorized analysis of snapshot histories, requires NumPy (install the
+### 'analysis' extra). The vmguestlib module itself does not depend on it.
+
+import warnings
+
+import numpy
+
+from vmguestlib import VMCounters, VMCumulative, VMGuestLibRates, VMGuestLibSnapshot
+
+class VMGuestLibHistory(object):
+    '''A batch of snapshots held as one array per counter, in time order.
+       Counters are float64 arrays with NaN where a counter was not available,
+       the session IDs are kept as a uint64 array as they do not fit a float.
+
+       Every derived array has one value per snapshot. Values that depend on
+       the previous snapshot are NaN for the first snapshot of every session,
+       where the counters restart, as VMGuestLibRateSampler does.'''
+    def __init__(self, timestamps, sessions, columns):
+        self.timestamps = timestamps
+        self.sessions = sessions
+        self.columns = columns
+        self._restarts = None
+
+    @classmethod
+    def FromSnapshots(cls, snapshots, timestamps=None):
+        '''Builds a history from VMGuestLibSnapshots, or from the
+           (timestamp, snapshot) tuples yielded by a VMGuestLibReplay when no
+           timestamps are given.'''
+        snapshots = list(snapshots)
+        if timestamps is None:
+            timestamps = [ timestamp for timestamp, snapshot in snapshots ]
+            snapshots = [ snapshot for timestamp, snapshot in snapshots ]
+        values = numpy.array([ tuple(snapshot[1:]) for snapshot in snapshots ], dtype=float).reshape(len(snapshots), len(VMCounters))
+        return cls(
+            numpy.asarray(timestamps, dtype=float),
+            numpy.array([ snapshot.SessionId for snapshot in snapshots ], dtype=numpy.uint64),
+            dict([ (name, values[:, index]) for index, (name, ctype, doc) in enumerate(VMCounters) ]),
+        )
+
+    @classmethod
+    def FromReplay(cls, replay, start=None, end=None):
+        '''Loads the snapshots of a VMGuestLibReplay recorded from start up to and
+           including end (timestamps in seconds), decoding whole blocks at once
+           straight from its memory map.'''
+        fields = len(replay.fields)
+        timestamps, sessions, blocks = [], [], []
+        for index in range(replay.blocks):
+            ms, count, mask, base = replay.Block(index)
+            if end is not None and ms > end * 1000.0:
+                break
+            offset = replay.start + index * replay.blockbytes + replay.block.size
+            deltas = numpy.frombuffer(replay.map, dtype='<i4', count=count * (fields + 1), offset=offset).reshape(count, fields + 1)
+            # Widened first, the epoch milliseconds do not fit the int32 deltas
+            times = (deltas[:, 0].astype(numpy.int64) + ms) / 1000.0
+            if start is not None and count and times[-1] < start:
+                continue
+            values = numpy.empty((count, len(VMCounters)))
+            for column, (name, ctype, doc) in enumerate(VMCounters):
+                position = replay.positions[column + 1]
+                if position is None or not mask & (1 << position):
+                    values[:, column] = numpy.nan
+                else:
+                    values[:, column] = float(base[position]) + deltas[:, position + 1]
+            sid = replay.positions[0]
+            timestamps.append(times)
+            sessions.append(numpy.uint64(base[sid]) + deltas[:, sid + 1].astype(numpy.int64).astype(numpy.uint64))
+            blocks.append(values)
+
+        if blocks:
+            times = numpy.concatenate(timestamps)
+            values = numpy.concatenate(blocks)
+            sids = numpy.concatenate(sessions)
+        else:
+            times = numpy.empty(0)
+            values = numpy.empty((0, len(VMCounters)))
+            sids = numpy.empty(0, dtype=numpy.uint64)
+        selected = numpy.ones(len(times), dtype=bool)
+        if start is not None:
+            selected &= times >= start
+        if end is not None:
+            selected &= times <= end
+        return cls(
+            times[selected],
+            sids[selected],
+            dict([ (name, values[selected, index]) for index, (name, ctype, doc) in enumerate(VMCounters) ]),
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, name):
+        if name == 'SessionId':
+            return self.sessions
+        return self.columns[name]
+
+    def Restarts(self):
+        '''Returns a boolean array telling which snapshots start a session: the
+           first one, and those where the session ID changed or a cumulative
+           counter went backwards.'''
+        if self._restarts is None:
+            restarts = numpy.ones(len(self), dtype=bool)
+            if len(self) > 1:
+                changed = self.sessions[1:] != self.sessions[:-1]
+                for name in VMCumulative:
+                    with numpy.errstate(invalid='ignore'):
+                        changed |= numpy.diff(self.columns[name]) < 0
+                restarts[1:] = changed
+            self._restarts = restarts
+        return self._restarts
+
+    def Sessions(self):
+        '''Returns the (start, stop) index ranges of the sessions.'''
+        starts = numpy.flatnonzero(self.Restarts())
+        stops = numpy.append(starts[1:], len(self))
+        return list(zip(starts.tolist(), stops.tolist()))
+
+    def Split(self):
+        '''Returns a VMGuestLibHistory for every session.'''
+        return [ self.Slice(start, stop) for start, stop in self.Sessions() ]
+
+    def Slice(self, start, stop):
+        '''Returns a VMGuestLibHistory of the snapshots from index start to stop.'''
+        return VMGuestLibHistory(
+            self.timestamps[start:stop],
+            self.sessions[start:stop],
+            dict([ (name, column[start:stop]) for name, column in self.columns.items() ]),
+        )
+
+    def Deltas(self, name):
+        '''Returns the change of a counter since the previous snapshot.'''
+        deltas = numpy.empty(len(self))
+        deltas[:1] = numpy.nan
+        deltas[1:] = numpy.diff(self.columns[name])
+        deltas[self.Restarts()] = numpy.nan
+        return deltas
+
+    def Rates(self):
+        '''Returns the VMGuestLibRates fields as arrays, computed the way
+           VMGuestLibRateSampler does for every pair of consecutive snapshots.'''
+        elapsed = self.Deltas('ElapsedMs')
+        used = self._Rate('CpuUsedMs', elapsed, 100.0)
+        return VMGuestLibRates(
+            self.sessions,
+            elapsed,
+            used,
+            self._Rate('CpuStolenMs', elapsed, 100.0),
+            self.columns['HostProcessorSpeed'] * used / 100.0,
+            self._Rate('HostCpuUsedMs', elapsed, 100.0),
+            self._Rate('MemBalloonedMB', elapsed, 1000.0),
+            self._Rate('MemSwappedMB', elapsed, 1000.0),
+        )
+
+    def _Rate(self, name, elapsed, scale):
+        '''Returns the change of a counter per elapsed millisecond, times scale.
+           Like VMGuestLibRateSampler, the rate is 0 when no time elapsed,
+           unless the counter is not available.'''
+        deltas = self.Deltas(name)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rates = deltas * scale / elapsed
+        rates[(elapsed == 0) & ~numpy.isnan(deltas)] = 0.0
+        return rates
+
+    def MemoryPressure(self):
+        '''Returns the percentage of the memory of the virtual machine that the
+           host reclaimed by ballooning, swapping or compressing it. Compressed
+           memory is left out when MemZippedMB is not available.'''
+        reclaimed = self.columns['MemBalloonedMB'] + self.columns['MemSwappedMB'] + numpy.nan_to_num(self.columns['MemZippedMB'])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return reclaimed * 100.0 / (self.columns['MemMappedMB'] + reclaimed)
+
+def Percentiles(values, percentiles=(50, 90, 99)):
+    '''Returns the given percentiles of an array, ignoring NaN.'''
+    return numpy.nanpercentile(values, percentiles)
+
+def Rolling(values, window, function='mean'):
+    '''Returns the rolling mean, sum, min or max of an array over window
+       values, ignoring NaN. The first window - 1 values are NaN.'''
+    values = numpy.asarray(values, dtype=float)
+    result = numpy.empty(len(values))
+    result[:] = numpy.nan
+    if len(values) < window:
+        return result
+    if function in ('mean', 'sum'):
+        present = ~numpy.isnan(values)
+        sums = numpy.cumsum(numpy.where(present, values, 0.0))
+        counts = numpy.cumsum(present)
+        sums = sums[window - 1:] - numpy.append(0.0, sums[:-window])
+        counts = counts[window - 1:] - numpy.append(0, counts[:-window])
+        if function == 'mean':
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                sums = sums / counts
+        sums[counts == 0] = numpy.nan
+        result[window - 1:] = sums
+    elif function in ('min', 'max'):
+        # One row per window, as a view on the array
+        stride = values.strides[0]
+        windows = numpy.lib.stride_tricks.as_strided(values, (len(values) - window + 1, window), (stride, stride))
+        # Windows without any value give NaN, without warning about it
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if function == 'min':
+                result[window - 1:] = numpy.nanmin(windows, axis=1)
+            else:
+                result[window - 1:] = numpy.nanmax(windows, axis=1)
+    else:
+        raise ValueError('Unknown rolling function %s' % function)
+    return result
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,102 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### asyncio interface to vmguestlib, requires Python 3.7 or newer.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from vmguestlib import VMGuestLib
+
+class AsyncVMGuestLib(object):
+    '''Runs a VMGuestLib on a dedicated thread, so the event loop is never
+       blocked by VMGuestLib_UpdateInfo or the counter routines. As that thread
+       is the only one using the handle, no locking is needed.
+
+       Coroutines calling UpdateAndSnapshot() while an update is already in
+       flight wait for that update instead of starting another one, so any number
+       of concurrent callers cost a single VMGuestLib_UpdateInfo.'''
+    def __init__(self, backend=None):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._gl = self._executor.submit(VMGuestLib, backend)
+        self._pending = None
+
+        # Number of UpdateAndSnapshot() calls, and of updates they caused
+        self.requests = 0
+        self.updates = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.CloseHandle()
+
+    async def _Run(self, method):
+        '''Runs a VMGuestLib method on the dedicated thread.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: getattr(self._gl.result(), method)())
+
+    def _Done(self, future):
+        self._pending = None
+
+    async def UpdateAndSnapshot(self):
+        '''Updates information about the virtual machine and returns a
+           VMGuestLibSnapshot, sharing the update with concurrent callers.'''
+        self.requests = self.requests + 1
+        if self._pending is None:
+            self.updates = self.updates + 1
+            self._pending = asyncio.ensure_future(self._Run('UpdateAndSnapshot'))
+            self._pending.add_done_callback(self._Done)
+        # A cancelled caller must not cancel the update other callers wait for
+        return await asyncio.shield(self._pending)
+
+    async def Snapshot(self):
+        '''Returns a VMGuestLibSnapshot of the information retrieved by the last
+           update.'''
+        return await self._Run('Snapshot')
+
+    async def CloseHandle(self):
+        '''Releases the handle, after any update in flight, and stops the thread.'''
+        if self._executor is not None:
+            try:
+                await self._Run('CloseHandle')
+            finally:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+async def Stream(interval=1.0, backend=None):
+    '''Yields a fresh VMGuestLibSnapshot every interval seconds, scheduled on the
+       event loop clock so the interval does not drift. The handle is released
+       when the iteration ends or is cancelled.
+
+       async for snap in Stream(interval=1.0):
+           print(snap.CpuUsedMs)'''
+    gl = AsyncVMGuestLib(backend)
+    loop = asyncio.get_running_loop()
+    try:
+        deadline = loop.time()
+        while True:
+            yield await gl.UpdateAndSnapshot()
+            deadline = deadline + interval
+            delay = deadline - loop.time()
+            if delay < 0:
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+    finally:
+        await gl.CloseHandle()
+
+# vim:ts=4:sw=4:et
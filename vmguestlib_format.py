@@ -0,0 +1,203 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Machine-readable formatting of snapshots and rates, as CSV, JSON Lines or
+### Prometheus text exposition. Every formatter renders one sample into a
+### single string, so a tick can be written out in one go.
+
+import bisect
+import json
+import re
+import threading
+
+from vmguestlib import VMCounters, VMCumulative, VMGuestLibRates
+
+# Counters and rates shown by every group, the counters in VMCounters order
+VMFieldGroups = (
+    ('cpu', (
+        'CpuLimitMHz', 'CpuReservationMHz', 'CpuShares', 'CpuStolenMs',
+        'CpuUsedMs', 'ElapsedMs', 'HostProcessorSpeed',
+    ), (
+        'CpuUsedPct', 'CpuStolenPct', 'EffectiveMHz',
+    )),
+    ('memory', (
+        'MemActiveMB', 'MemBalloonedMB', 'MemLimitMB', 'MemMappedMB',
+        'MemOverheadMB', 'MemReservationMB', 'MemSharedMB', 'MemSharedSavedMB',
+        'MemShares', 'MemSwappedMB', 'MemTargetSizeMB', 'MemUsedMB',
+    ), (
+        'MemBalloonedMBps', 'MemSwappedMBps',
+    )),
+    ('host', (
+        'HostCpuUsedMs', 'HostMemKernOvhdMB', 'HostMemMappedMB',
+        'HostMemPhysFreeMB', 'HostMemPhysMB', 'HostMemSharedMB',
+        'HostMemSwappedMB', 'HostMemUnmappedMB', 'HostMemUsedMB',
+        'HostNumCpuCores',
+    ), (
+        'HostCpuUsedPct',
+    )),
+    ('undocumented', (
+        'MemBalloonMaxMB', 'MemBalloonTargetMB', 'MemLLSwappedMB',
+        'MemSwapTargetMB', 'MemZippedMB', 'MemZipSavedMB',
+    ), ()),
+)
+
+def Fields(groups):
+    '''Returns the counters and rates of the given groups, each in the order of
+       VMCounters and VMGuestLibRates.'''
+    counters, rates = set(), set()
+    for group, groupcounters, grouprates in VMFieldGroups:
+        if group in groups:
+            counters.update(groupcounters)
+            rates.update(grouprates)
+    return (
+        tuple([ name for name, ctype, doc in VMCounters if name in counters ]),
+        tuple([ name for name in VMGuestLibRates._fields if name in rates ]),
+    )
+
+def _Value(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return '%.2f' % value
+    return '%d' % value
+
+class VMGuestLibFormatter(object):
+    '''Base of the formatters, holding the counters and rates they render.
+       Header() is written once before the first sample, the Format() of the
+       subclasses for every sample.'''
+    def __init__(self, counters, rates=()):
+        self.counters = tuple(counters)
+        self.rates = tuple(rates)
+
+    def Header(self):
+        return ''
+
+    def _Values(self, snapshot, rates):
+        '''Returns the formatted values of the counters and rates, None for
+           those that are not available.'''
+        values = [ _Value(getattr(snapshot, name)) for name in self.counters ]
+        if rates is None:
+            values.extend([ None ] * len(self.rates))
+        else:
+            values.extend([ _Value(getattr(rates, name)) for name in self.rates ])
+        return values
+
+class VMGuestLibCsvFormatter(VMGuestLibFormatter):
+    '''One line per sample, preceded by a header line naming the columns.
+       Values that are not available are left empty.'''
+    def Header(self):
+        return ','.join(('Timestamp', 'SessionId') + self.counters + self.rates) + '\n'
+
+    def Format(self, timestamp, snapshot, rates=None):
+        values = [ '%.3f' % timestamp, '%d' % snapshot.SessionId ]
+        values.extend([ value or '' for value in self._Values(snapshot, rates) ])
+        return ','.join(values) + '\n'
+
+class VMGuestLibJsonFormatter(VMGuestLibFormatter):
+    '''One JSON object per line. Values that are not available are null.'''
+    def __init__(self, counters, rates=()):
+        VMGuestLibFormatter.__init__(self, counters, rates)
+        # The keys do not change, only encode them once
+        self.keys = [ json.dumps(name) + ':' for name in self.counters + self.rates ]
+
+    def Format(self, timestamp, snapshot, rates=None):
+        items = [ '"Timestamp":%.3f' % timestamp, '"SessionId":%d' % snapshot.SessionId ]
+        for key, value in zip(self.keys, self._Values(snapshot, rates)):
+            items.append(key + (value or 'null'))
+        return '{' + ','.join(items) + '}\n'
+
+def MetricName(name):
+    '''Returns the Prometheus metric name of a counter or rate, CpuUsedMs
+       becomes vmguest_cpu_used_ms.'''
+    name = name.replace('MHz', 'Mhz').replace('MBps', 'Mbps')
+    name = re.sub('([A-Z]+)([A-Z][a-z])', r'\1_\2', name)
+    name = re.sub('([a-z0-9])([A-Z])', r'\1_\2', name)
+    return 'vmguest_' + name.lower()
+
+class VMGuestLibPrometheusFormatter(VMGuestLibFormatter):
+    '''A complete Prometheus text exposition per sample. Cumulative counters
+       are exposed as counters, everything else as gauges. Values that are not
+       available are left out. Samples carry the timestamp when one is given.'''
+    def __init__(self, counters, rates=()):
+        VMGuestLibFormatter.__init__(self, counters, rates)
+        descriptions = dict([ (name, doc) for name, ctype, doc in VMCounters ])
+        # The HELP and TYPE lines followed by the name of every metric
+        self.metrics = [ self._Metric('SessionId', 'gauge', 'Session ID of the current virtual machine session.') ]
+        for name in self.counters:
+            if name in VMCumulative:
+                self.metrics.append(self._Metric(name, 'counter', descriptions[name], '_total'))
+            else:
+                self.metrics.append(self._Metric(name, 'gauge', descriptions[name]))
+        for name in self.rates:
+            self.metrics.append(self._Metric(name, 'gauge', 'Rate of change over the last sample.'))
+
+    def _Metric(self, name, kind, doc, suffix=''):
+        metric = MetricName(name) + suffix
+        doc = ' '.join(doc.split()).replace('\\', '\\\\')
+        return '# HELP %s %s\n# TYPE %s %s\n%s ' % (metric, doc, metric, kind, metric)
+
+    def Format(self, timestamp=None, snapshot=None, rates=None):
+        if timestamp is None:
+            end = '\n'
+        else:
+            end = ' %d\n' % round(timestamp * 1000)
+        lines = []
+        for metric, value in zip(self.metrics, [ '%d' % snapshot.SessionId ] + self._Values(snapshot, rates)):
+            if value is not None:
+                lines.append(metric + value + end)
+        return ''.join(lines)
+
+class VMGuestLibHistogram(object):
+    '''A Prometheus histogram of durations in seconds. Observe() can be called
+       from any thread, Format() renders it in text exposition.'''
+    def __init__(self, name, doc, buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0)):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(buckets)
+        # Observations per bucket, not cumulative, the last one above all bounds
+        self.counts = [ 0 ] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def Observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] = self.counts[index] + 1
+            self.sum = self.sum + value
+            self.count = self.count + 1
+
+    def Format(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = [ '# HELP %s %s\n# TYPE %s histogram\n' % (self.name, self.doc, self.name) ]
+        cumulative = 0
+        for bound, observed in zip(self.buckets + ('+Inf', ), counts):
+            cumulative = cumulative + observed
+            if bound != '+Inf':
+                bound = repr(bound)
+            lines.append('%s_bucket{le="%s"} %d\n' % (self.name, bound, cumulative))
+        lines.append('%s_sum %r\n%s_count %d\n' % (self.name, total, self.name, count))
+        return ''.join(lines)
+
+VMFormatters = {
+    'csv': VMGuestLibCsvFormatter,
+    'json': VMGuestLibJsonFormatter,
+    'prometheus': VMGuestLibPrometheusFormatter,
+}
+
+# vim:ts=4:sw=4:et
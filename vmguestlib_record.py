@@ -0,0 +1,240 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Compact on-disk recording of VMGuestLibSnapshots, and their replay.
+###
+### A recording starts with a header holding the names of the recorded fields,
+### followed by fixed-size blocks. Every block starts with the absolute time
+### and values of its first snapshot and a mask of the fields that were
+### available, followed by slots for a fixed number of records. A record holds
+### the difference with those base values as 32-bit integers. A new block is
+### started when a block is full, when the available fields change or when a
+### difference does not fit, like after a session ID change. As every block
+### and record has a fixed size and position, a replay can find a time range
+### with a binary search over the block headers, reading the file through a
+### memory map without loading it.
+
+import mmap
+import os
+import struct
+import time
+
+from vmguestlib import VMGuestLibSnapshot
+
+VMRecordMagic = b'VMGLREC1'
+VMRecordVersion = 1
+
+# Magic, version, number of fields, records per block and length of the names
+_Header = struct.Struct('<8sHHII')
+
+_MinDelta = -0x80000000
+_MaxDelta = 0x7FFFFFFF
+
+def _Layout(fields):
+    '''Returns the block header and record structures for a number of fields.'''
+    # Base time in ms, number of records, padding, mask of available fields and
+    # base values
+    block = struct.Struct('<qIIQ' + 'Q' * fields)
+    # Time and value differences with the base
+    record = struct.Struct('<i' + 'i' * fields)
+    return block, record
+
+class VMGuestLibRecorder(object):
+    '''Appends snapshots to a recording, creating it if needed. Snapshots
+       appended to an existing recording start a new block.'''
+    def __init__(self, path, blocksize=256, flush=True):
+        self.path = path
+        self.flush = flush
+        fields = VMGuestLibSnapshot._fields
+        names = ','.join(fields).encode('ascii')
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            magic, version, count, blocksize, length = _Header.unpack(self.file.read(_Header.size))
+            if magic != VMRecordMagic or version != VMRecordVersion:
+                raise ValueError('%s is not a vmguestlib recording' % path)
+            if self.file.read(length) != names:
+                raise ValueError('%s was recorded with other counters' % path)
+        else:
+            self.file = open(path, 'w+b')
+            self.file.write(_Header.pack(VMRecordMagic, VMRecordVersion, len(fields), blocksize, len(names)))
+            self.file.write(names)
+            self.file.flush()
+
+        self.blocksize = blocksize
+        self.block, self.record = _Layout(len(fields))
+        self.start = _Header.size + len(names)
+        self.blockbytes = self.block.size + blocksize * self.record.size
+        self.file.seek(0, os.SEEK_END)
+        self.blocks = -(-(self.file.tell() - self.start) // self.blockbytes)
+
+        # Offset, time, mask and values of the current block
+        self.offset = None
+        self.time = None
+        self.base = None
+        self.mask = None
+        self.count = 0
+
+    def Append(self, snapshot, timestamp=None):
+        '''Records a snapshot, taken at timestamp (now by default).'''
+        if timestamp is None:
+            timestamp = time.time()
+        ms = int(round(timestamp * 1000))
+        mask = 0
+        for index, value in enumerate(snapshot):
+            if value is not None:
+                mask = mask | (1 << index)
+
+        if self.offset is not None and self.count < self.blocksize and mask == self.mask:
+            deltas = [ ms - self.time ]
+            for value, base in zip(snapshot, self.base):
+                if value is None:
+                    deltas.append(0)
+                else:
+                    deltas.append(value - base)
+            if min(deltas) >= _MinDelta and max(deltas) <= _MaxDelta:
+                self._Write(deltas)
+                return
+
+        self._StartBlock(ms, mask, snapshot)
+
+    def _StartBlock(self, ms, mask, snapshot):
+        '''Starts a new block with the snapshot as its base and first record.'''
+        self.offset = self.start + self.blocks * self.blockbytes
+        self.blocks = self.blocks + 1
+        self.time = ms
+        self.mask = mask
+        self.base = [ value or 0 for value in snapshot ]
+        self.count = 0
+        self.file.seek(self.offset)
+        self.file.write(self.block.pack(ms, 0, 0, mask, *self.base))
+        self._Write([ 0 ] * (len(self.base) + 1))
+
+    def _Write(self, deltas):
+        '''Writes a record in the next slot of the block, then its count.'''
+        self.file.seek(self.offset + self.block.size + self.count * self.record.size)
+        self.file.write(self.record.pack(*deltas))
+        self.count = self.count + 1
+        self.file.seek(self.offset + 8)
+        self.file.write(struct.pack('<I', self.count))
+        if self.flush:
+            self.file.flush()
+
+    def Close(self):
+        self.file.close()
+
+class VMGuestLibReplay(object):
+    '''Reads a recording through a memory map. Iterating over it yields
+       (timestamp, VMGuestLibSnapshot) tuples in recording order, Slice() only
+       those within a time range. Snapshots appended after opening the
+       recording are not seen.'''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, self.blocksize, length = _Header.unpack_from(self.map, 0)
+        if magic != VMRecordMagic or version != VMRecordVersion:
+            raise ValueError('%s is not a vmguestlib recording' % path)
+        self.fields = tuple(self.map[_Header.size:_Header.size + length].decode('ascii').split(','))
+        self.block, self.record = _Layout(count)
+        self.start = _Header.size + length
+        self.blockbytes = self.block.size + self.blocksize * self.record.size
+        self.blocks = -(-(len(self.map) - self.start) // self.blockbytes)
+
+        # Position of every snapshot field in the recording, None if not recorded
+        self.positions = []
+        for name in VMGuestLibSnapshot._fields:
+            if name in self.fields:
+                self.positions.append(self.fields.index(name))
+            else:
+                self.positions.append(None)
+
+    def __len__(self):
+        return sum([ self.Block(index)[1] for index in range(self.blocks) ])
+
+    def __iter__(self):
+        for index in range(self.blocks):
+            for entry in self._Records(index, 0):
+                yield entry
+
+    def Block(self, index):
+        '''Returns the base time in ms, number of records, mask of available
+           fields and base values of a block.'''
+        header = self.block.unpack_from(self.map, self.start + index * self.blockbytes)
+        return header[0], header[1], header[3], header[4:]
+
+    def _Records(self, index, first):
+        '''Yields the records of a block, from the given one on.'''
+        ms, count, mask, base = self.Block(index)
+        offset = self.start + index * self.blockbytes + self.block.size
+        available = [ position is not None and mask & (1 << position) for position in self.positions ]
+        for number in range(first, count):
+            deltas = self.record.unpack_from(self.map, offset + number * self.record.size)
+            values = []
+            for position, present in zip(self.positions, available):
+                if present:
+                    values.append(base[position] + deltas[position + 1])
+                else:
+                    values.append(None)
+            yield (ms + deltas[0]) / 1000.0, VMGuestLibSnapshot._make(values)
+
+    def _Time(self, index, number):
+        '''Returns the time in ms of a record.'''
+        offset = self.start + index * self.blockbytes + self.block.size + number * self.record.size
+        return self.Block(index)[0] + struct.unpack_from('<i', self.map, offset)[0]
+
+    def Slice(self, start=None, end=None):
+        '''Yields the (timestamp, VMGuestLibSnapshot) tuples recorded from start up
+           to and including end, both timestamps in seconds.'''
+        if self.blocks == 0:
+            return
+        index = number = 0
+        if start is not None:
+            ms = start * 1000.0
+            # Last block starting before the range
+            low, high = 0, self.blocks
+            while high - low > 1:
+                middle = (low + high) // 2
+                if self.Block(middle)[0] <= ms:
+                    low = middle
+                else:
+                    high = middle
+            index = low
+            # First record in that block within the range
+            count = self.Block(index)[1]
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if self._Time(index, middle) < ms:
+                    low = middle + 1
+                else:
+                    high = middle
+            number = low
+        while index < self.blocks:
+            for timestamp, snapshot in self._Records(index, number):
+                if end is not None and timestamp > end:
+                    return
+                if start is None or timestamp >= start:
+                    yield timestamp, snapshot
+            index = index + 1
+            number = 0
+
+    def Close(self):
+        self.map.close()
+        self.file.close()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,271 @@
+### This program is free software; you can redistribute it and/or
+### modify it under the terms of the GNU General Public License
+### as published by the Free Software Foundation; either version 2
+### of the License, or (at your option) any later version.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+### Copyright 2013-2014 Dag Wieers <dag@wieers.com>
+
+### Shares the snapshots of a single handle with any number of local processes
+### through a memory-mapped file, by default in /dev/shm.
+###
+### One process runs a VMGuestLibPublisher, which owns the only handle and
+### writes every snapshot into the file. The file has a fixed layout: a header
+### with the names of the fields, a sequence number, and the time, mask of
+### available fields and values of the latest snapshot. The sequence number is
+### odd while a snapshot is being written and even once it is complete, so a
+### VMGuestLibSharedReader retries when it changed while reading (a seqlock).
+### Readers never block the publisher and never call into the library,
+### however many of them there are.
+
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from vmguestlib import VMErrors, VMGuestLibSampler, VMGuestLibSnapshot, \
+    VMGuestLibException, CachedVMGuestLib, VMGUESTLIB_ERROR_NO_INFO
+
+VMSharedMagic = b'VMGLSHM1'
+VMSharedVersion = 2
+
+if os.path.isdir('/dev/shm'):
+    VMSharedPath = '/dev/shm/vmguestlib'
+else:
+    VMSharedPath = os.path.join(tempfile.gettempdir(), 'vmguestlib.shm')
+
+# Magic, version, number of fields and length of the names
+_Header = struct.Struct('<8sHHI')
+# Seconds between snapshots of the publisher
+_Interval = struct.Struct('<d')
+_IntervalOffset = _Header.size
+_Sequence = struct.Struct('<Q')
+_SequenceOffset = _IntervalOffset + _Interval.size
+_DataOffset = _SequenceOffset + _Sequence.size
+
+# Seconds a reader retries before giving up on a publisher that stopped halfway
+_Timeout = 1.0
+
+def _Layout(fields):
+    '''Returns the structure of a snapshot: time, mask of available fields and
+       values.'''
+    return struct.Struct('<dQ' + 'Q' * fields)
+
+class VMGuestLibPublisher(VMGuestLibSampler):
+    '''A VMGuestLibSampler that also writes every snapshot it takes into the
+       file at path, for VMGuestLibSharedReaders. Publish() can be used on its
+       own as well, without starting the sampler thread.'''
+    def __init__(self, path=VMSharedPath, interval=1.0, backend=None):
+        VMGuestLibSampler.__init__(self, interval, None, backend)
+        self.path = path
+        # The last snapshot written
+        self._written = None
+        fields = VMGuestLibSnapshot._fields
+        names = ','.join(fields).encode('ascii')
+        self.data = _Layout(len(fields))
+        size = _DataOffset + self.data.size + len(names)
+        header = _Header.pack(VMSharedMagic, VMSharedVersion, len(fields), len(names))
+
+        # Readers keep an existing file mapped, so it is reused when it has the
+        # same layout. Otherwise a complete new one replaces it.
+        self.file = None
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            self.file = open(path, 'r+b')
+            existing = self.file.read(size)
+            if existing[:_Header.size] != header or existing[-len(names):] != names:
+                self.file.close()
+                self.file = None
+        if self.file is None:
+            temp = '%s.%d' % (path, os.getpid())
+            output = open(temp, 'wb')
+            output.write(header + _Interval.pack(interval) + _Sequence.pack(0) +
+                b'\0' * self.data.size + names)
+            output.close()
+            os.rename(temp, path)
+            self.file = open(path, 'r+b')
+
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.map[_IntervalOffset:_SequenceOffset] = _Interval.pack(interval)
+        self.sequence = _Sequence.unpack_from(self.map, _SequenceOffset)[0]
+        # A publisher that stopped halfway leaves an odd sequence number
+        self.sequence = self.sequence + (self.sequence & 1)
+
+    def _Sample(self):
+        VMGuestLibSampler._Sample(self)
+        published = self.published
+        if published is not None and published[1] is not self._written:
+            self.Publish(published[1])
+
+    def Publish(self, snapshot, timestamp=None):
+        '''Writes a snapshot, taken at timestamp (now by default).'''
+        if timestamp is None:
+            timestamp = time.time()
+        mask = 0
+        values = []
+        for index, value in enumerate(snapshot):
+            if value is None:
+                values.append(0)
+            else:
+                mask = mask | (1 << index)
+                values.append(value)
+        data = self.data.pack(timestamp, mask, *values)
+        # The sequence number is odd while writing. Packed values are copied in
+        # with a single memcpy, as pack_into() clears the memory first and
+        # readers could see a sequence number of 0.
+        self.map[_SequenceOffset:_DataOffset] = _Sequence.pack(self.sequence + 1)
+        self.map[_DataOffset:_DataOffset + self.data.size] = data
+        self.map[_SequenceOffset:_DataOffset] = _Sequence.pack(self.sequence + 2)
+        self.sequence = self.sequence + 2
+        self._written = snapshot
+
+    def Stop(self):
+        '''Stops sampling and unmaps the file, the publisher cannot be started
+           again.'''
+        VMGuestLibSampler.Stop(self)
+        self.map.close()
+        self.file.close()
+
+class _SharedErrors(object):
+    '''Error texts for VMGuestLibExceptions raised by readers, which do not load
+       the library.'''
+    def ErrorText(self, errno):
+        if 0 <= errno < len(VMErrors):
+            return VMErrors[errno]
+        return 'Unknown error %d' % errno
+
+class VMGuestLibSharedMemory(object):
+    '''Reads the latest snapshot from the file of a VMGuestLibPublisher. Like a
+       VMGuestLibCache, it can be shared by many CachedVMGuestLibs. Snapshots
+       older than staleness seconds (three intervals of the publisher by
+       default) are refused, so a publisher that died is noticed.'''
+    backend = _SharedErrors()
+
+    def __init__(self, path=VMSharedPath, staleness=None):
+        self.path = path
+        self.staleness = staleness
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, length = _Header.unpack_from(self.map, 0)
+        if magic != VMSharedMagic or version != VMSharedVersion:
+            raise ValueError('%s is not published by vmguestlib' % path)
+        self.data = _Layout(count)
+        start = _DataOffset + self.data.size
+        if self.map[start:start + length].decode('ascii').split(',') != list(VMGuestLibSnapshot._fields):
+            raise ValueError('%s was published with other counters' % path)
+
+        # Sequence number, time and snapshot of the last read
+        self.sequence = None
+        self.timestamp = None
+        self.snapshot = None
+
+    def _Read(self):
+        '''Reads a complete snapshot, retrying while the publisher writes.'''
+        attempt = 0
+        deadline = None
+        while True:
+            sequence = _Sequence.unpack_from(self.map, _SequenceOffset)[0]
+            if sequence == self.sequence:
+                return
+            if not sequence & 1:
+                # Copy first, to keep the window the publisher can write in short
+                data = self.map[_DataOffset:_DataOffset + self.data.size]
+                if _Sequence.unpack_from(self.map, _SequenceOffset)[0] == sequence:
+                    break
+            # The publisher may have been preempted while writing, give it time
+            attempt = attempt + 1
+            if attempt < 10:
+                time.sleep(0)
+                continue
+            if deadline is None:
+                deadline = time.time() + _Timeout
+            elif time.time() > deadline:
+                raise VMGuestLibException(VMGUESTLIB_ERROR_NO_INFO, self.backend)
+            time.sleep(0.0001)
+
+        # Nothing was published yet
+        if sequence == 0:
+            raise VMGuestLibException(VMGUESTLIB_ERROR_NO_INFO, self.backend)
+        data = self.data.unpack(data)
+        mask = data[1]
+        values = []
+        for index, value in enumerate(data[2:]):
+            if mask & (1 << index):
+                values.append(value)
+            else:
+                values.append(None)
+        self.sequence = sequence
+        self.timestamp = data[0]
+        self.snapshot = VMGuestLibSnapshot._make(values)
+
+    def Snapshot(self):
+        '''Returns the latest VMGuestLibSnapshot published. Raises a
+           VMGuestLibException with VMGUESTLIB_ERROR_NO_INFO when none was
+           published yet, or when it is older than staleness seconds. A
+           staleness of 0 disables the check.'''
+        self._Read()
+        staleness = self.staleness
+        if staleness is None:
+            staleness = 3 * _Interval.unpack_from(self.map, _IntervalOffset)[0]
+        if staleness > 0 and self.Age() > staleness:
+            raise VMGuestLibException(VMGUESTLIB_ERROR_NO_INFO, self.backend)
+        return self.snapshot
+
+    def Age(self):
+        '''Returns the number of seconds since the snapshot last read was
+           published, or None if none was read.'''
+        if self.timestamp is None:
+            return None
+        return time.time() - self.timestamp
+
+    def Close(self):
+        self.map.close()
+        self.file.close()
+
+class VMGuestLibSharedReader(CachedVMGuestLib):
+    '''A VMGuestLib reading the snapshots of a VMGuestLibPublisher from shared
+       memory, with the same getters. UpdateInfo() takes the latest snapshot
+       published and never calls into the library.'''
+    def __init__(self, path=VMSharedPath, staleness=None):
+        CachedVMGuestLib.__init__(self, VMGuestLibSharedMemory(path, staleness))
+
+    def CloseHandle(self):
+        '''Unmaps the shared memory.'''
+        self.cache.Close()
+
+    def ReopenHandle(self):
+        '''There is no handle to replace, takes the latest snapshot published.'''
+        self.UpdateInfo()
+
+    def Instrument(self, hook=None):
+        '''Readers make no library calls, so there is nothing to instrument;
+           instrument the publisher instead. Returns None.'''
+        return None
+
+if __name__ == '__main__':
+    import optparse
+
+    parser = optparse.OptionParser(usage='usage: %prog [-i SECONDS] [PATH]')
+    parser.add_option( '-i', '--interval', action='store', type='float', metavar='SECONDS', default=1.0,
+        dest='interval', help='publish a snapshot every SECONDS (default 1)' )
+    (options, args) = parser.parse_args()
+
+    publisher = VMGuestLibPublisher(args and args[0] or VMSharedPath, options.interval)
+    publisher.Start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    publisher.Stop()
+
+# vim:ts=4:sw=4:et